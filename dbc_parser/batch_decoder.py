@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+from decoder import (EXTENDED_ID_FLAG, EXTENDED_ID_MASK, MessageDecoder, enum_choices, frame_key, lookup_frame,
+                     signal_shift)
+from instrumentation import logger
+from utils import CAN_Message
+
+_WINDOW_BYTES = 8
+
+
+class MessageBatchDecoder:
+    """
+    Vectorized decode plan of a single CAN message. Every signal is read from an 8-byte window of the
+    payload starting at the byte holding its start bit, viewed as one uint64 per frame. Signals that
+    don't fit into such a window are decoded frame by frame with the scalar MessageDecoder.
+    """
+    __slots__ = ("msg_name", "msg_id", "msg_len", "names", "plan", "padded_width", "scalar")
+
+    def __init__(self, can_message: CAN_Message):
+        self.msg_name = can_message.msg_name
+        self.msg_id = can_message.msg_id
+        self.msg_len = can_message.msg_len
+        self.names = [signal.signal_name for signal in can_message.signals]
+
+        plan = []
+        wide_signals = []
+        for signal in can_message.signals:
+            first_byte, bit_in_byte = divmod(signal.bit_start, 8)
+            if signal.endianness == "little-endian":
+                dtype = np.dtype("<u8")
+                shift = bit_in_byte
+            else:
+                # Motorola start bits point to the MSB, which sits in the first byte of the window
+                dtype = np.dtype(">u8")
+                shift = (_WINDOW_BYTES - 1) * 8 + bit_in_byte - signal.bit_len + 1
+            if shift < 0 or shift + signal.bit_len > 64:
+                wide_signals.append(signal)
+                continue
+
+            sign_bit = 0 if signal.unsigned else 1 << (signal.bit_len - 1)
+            identity = signal.scale == 1 and signal.offset == 0
+            plan.append((signal.signal_name, first_byte, dtype, np.uint64(shift),
+                         np.uint64((1 << signal.bit_len) - 1), np.uint64(sign_bit),
+                         None if identity else signal.scale, signal.offset, enum_choices(signal)))
+        self.plan = tuple(plan)
+        self.padded_width = max([step[1] for step in plan], default=0) + _WINDOW_BYTES
+
+        scalar_signals = []
+        for signal in wide_signals:
+            if signal_shift(signal, self.msg_len) < 0:
+                logger.warning("Signal %s doesn't fit into %s (%d bytes), skipped by the batch decoder",
+                               signal.signal_name, self.msg_name, self.msg_len)
+                self.names.remove(signal.signal_name)
+            else:
+                scalar_signals.append(signal)
+        # Built as a plain CAN_Message, so that compact mode MessageView objects work as well
+        self.scalar = MessageDecoder(CAN_Message(self.msg_name, self.msg_id, self.msg_len, can_message.sender,
+                                                 scalar_signals)) if scalar_signals else None
+
+    def decode(self, payloads: np.ndarray, decode_choices: bool = False):
+        """Decodes a (frames, bytes) uint8 array of this message into {signal name: column array}."""
+        padded = np.zeros((payloads.shape[0], max(self.padded_width, payloads.shape[1])), dtype=np.uint8)
+        padded[:, :payloads.shape[1]] = payloads
+
+        columns = {}
+        for name, first_byte, dtype, shift, mask, sign_bit, scale, offset, choices in self.plan:
+            window = np.ascontiguousarray(padded[:, first_byte:first_byte + _WINDOW_BYTES])
+            raw = (window.view(dtype)[:, 0].astype(np.uint64) >> shift) & mask
+            if sign_bit:
+                # Two's complement sign extension that stays within uint64 arithmetic, also for 64-bit signals
+                raw = ((raw ^ sign_bit) - sign_bit).view(np.int64)
+
+            values = raw if scale is None else raw * scale + offset
+            if choices is not None and decode_choices:
+                columns[name] = _apply_choices(raw, values, choices)
+            else:
+                columns[name] = values
+
+        if self.scalar is not None:
+            # Signals wider than the window, one Python decode per frame (the values may not fit into 64 bits)
+            rows = [self.scalar.decode(payload.tobytes(), decode_choices) for payload in payloads]
+            for name in self.scalar.names:
+                column = np.empty(len(rows), dtype=object)
+                column[:] = [row[name] for row in rows]
+                columns[name] = column
+            columns = {name: columns[name] for name in self.names}
+        return columns
+
+
+def _apply_choices(raw: np.ndarray, values: np.ndarray, choices: dict):
+    """Returns the physical values, with the VAL_ label wherever the raw value has one."""
+    # VAL_ keys the raw type can't hold (e.g. negative keys of an unsigned signal) can never match
+    limits = np.iinfo(raw.dtype)
+    keys = np.array(sorted(key for key in choices if limits.min <= key <= limits.max), dtype=raw.dtype)
+    decoded = values.astype(object)
+    if not len(keys):
+        return decoded
+    labels = np.array([choices[key] for key in keys.tolist()], dtype=object)
+    index = np.clip(np.searchsorted(keys, raw), 0, len(keys) - 1)
+    found = keys[index] == raw
+    decoded[found] = labels[index[found]]
+    return decoded
+
+
+class CAN_BatchDecoder:
+    """Decodes whole traces at once - frames are grouped by ID and each message is decoded column-wise."""
+
+    def __init__(self, can_messages):
+        self.decoders = {}
+        for can_message in can_messages:
+            self.decoders[frame_key(can_message.msg_id)] = MessageBatchDecoder(can_message)
+
+    @classmethod
+    def from_parsed_objects(cls, parsed_objects: dict):
+        return cls(can_message for messages in parsed_objects.values() for can_message in messages)
+
+    def decode(self, msg_ids: np.ndarray, payloads: np.ndarray, timestamps: np.ndarray = None,
+               decode_choices: bool = False, is_extended: np.ndarray = None):
+        """
+        Returns {message name: {"timestamp": array, signal name: array, ...}} for the frames with known IDs.
+        msg_ids is a 1-D integer array, payloads a (frames, bytes) uint8 array and timestamps and is_extended
+        optional 1-D arrays, all in the same frame order, which is preserved within each message. Without
+        is_extended the frame type is taken from the IDs as in lookup_frame.
+        """
+        msg_ids = np.asarray(msg_ids, dtype=np.int64)
+        payloads = np.asarray(payloads, dtype=np.uint8)
+        if is_extended is not None:
+            flags = np.where(np.asarray(is_extended, dtype=bool), EXTENDED_ID_FLAG, 0)
+            msg_ids = (msg_ids & EXTENDED_ID_MASK) | flags
+
+        order = np.argsort(msg_ids, kind="stable")
+        unique_ids, group_starts = np.unique(msg_ids[order], return_index=True)
+        group_ends = np.append(group_starts[1:], len(order))
+
+        # Frames of one message may come under several IDs (with and without the extended flag)
+        groups = {}
+        for msg_id, start, end in zip(unique_ids.tolist(), group_starts, group_ends):
+            message_decoder = lookup_frame(self.decoders, msg_id,
+                                           None if is_extended is None else bool(msg_id & EXTENDED_ID_FLAG))
+            if message_decoder is not None:
+                groups.setdefault(message_decoder, []).append(order[start:end])
+
+        decoded = {}
+        for message_decoder, row_groups in groups.items():
+            rows = row_groups[0] if len(row_groups) == 1 else np.sort(np.concatenate(row_groups))
+            columns = {}
+            if timestamps is not None:
+                columns["timestamp"] = np.asarray(timestamps)[rows]
+            columns.update(message_decoder.decode(payloads[rows], decode_choices))
+            decoded[message_decoder.msg_name] = columns
+        return decoded
+
+    def decode_to_dataframes(self, msg_ids, payloads, timestamps=None, decode_choices: bool = False):
+        return {msg_name: pd.DataFrame(columns)
+                for msg_name, columns in self.decode(msg_ids, payloads, timestamps, decode_choices).items()}
@@ -0,0 +1,253 @@
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import dbc_parser
+from dbc_cache import load_dbc
+from dbc_generator import generate_dbc
+from dbc_parser import read_dbc_regex, read_CAN_messages, _process_signal_values, parse_dbcs
+from instrumentation import RUN_REPORT
+from regexes import VAL_REGEX
+from signal_table import SignalTable
+from tokenizer import tokenize_dbc
+from utils import CAN_dbc, write_data_to_xlsx, write_data_to_xlsx_streaming
+
+DEFAULT_SIZES = [1000, 10000, 50000]
+BENCHMARK_NAMES = ["read_CAN_messages", "_process_signal_values", "load_dbc", "parse_dbcs", "write_data_to_xlsx",
+                   "write_data_to_xlsx_streaming"]
+BENCHMARK_DBC_NAME = "Benchmark"
+
+
+def _time_it(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def compare_parsers(dbc_text: str, repeat: int = 3):
+    regex_time = _time_it(lambda: read_dbc_regex("benchmark", dbc_text), repeat)
+    tokenizer_time = _time_it(lambda: tokenize_dbc(io.StringIO(dbc_text)), repeat)
+    return regex_time, tokenizer_time
+
+
+def _retained_memory(build):
+    """Returns the object built by the function, the memory it keeps allocated and the peak during the build."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = build()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return built, current - before, peak - before
+
+
+def compare_memory(dbc_text: str):
+    """
+    Returns the retained and peak memory of the dataclass model and of the SignalTable of the same DBC.
+    The table is measured from the text, parse included, with the intermediate model dropped, so the
+    name strings it shares with the model are counted for it too.
+    """
+    _, model_size, model_peak = _retained_memory(lambda: tokenize_dbc(io.StringIO(dbc_text)))
+    _, table_size, table_peak = _retained_memory(lambda: SignalTable(tokenize_dbc(io.StringIO(dbc_text))))
+    return model_size, table_size, model_peak, table_peak
+
+
+@contextmanager
+def _working_dir(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def _run_parse_dbcs(dbc_path):
+    for parsed in (dbc_parser.PARSED_OBJECTS, dbc_parser.PARSED_NODES, dbc_parser.PARSED_TABLES,
+                   dbc_parser.PARSED_INDEXES):
+        parsed.clear()
+    RUN_REPORT.reset()
+    # parse_dbcs always exports next to the working directory, see _run_suite_size
+    parse_dbcs([CAN_dbc(name=BENCHMARK_DBC_NAME, dbc_path=dbc_path)], use_cache=False, streaming_export=True)
+
+
+def _prepare_benchmarks(dbc_path, dbc_text, work_dir):
+    """Returns the benchmarked callables of one DBC; everything they need is prepared beforehand."""
+    values = re.findall(VAL_REGEX, dbc_text, flags=re.MULTILINE)
+    data = {BENCHMARK_DBC_NAME: load_dbc(dbc_path, use_cache=False).messages}
+    xlsx_path = os.path.join(work_dir, "benchmark.xlsx")
+    return {
+        "read_CAN_messages": lambda: read_CAN_messages(BENCHMARK_DBC_NAME, dbc_text),
+        "_process_signal_values": lambda: _process_signal_values(values),
+        "load_dbc": lambda: load_dbc(dbc_path, use_cache=False),
+        "parse_dbcs": lambda: _run_parse_dbcs(dbc_path),
+        "write_data_to_xlsx": lambda: write_data_to_xlsx(xlsx_path, data),
+        "write_data_to_xlsx_streaming": lambda: write_data_to_xlsx_streaming(xlsx_path, data),
+    }
+
+
+def _peak_memory(function):
+    """Returns the peak memory allocated while the function runs, on top of what was allocated before."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _run_suite_size(msg_count, benchmarks, repeat, measure_memory, generator_options, work_dir):
+    dbc_text = generate_dbc(msg_count, **generator_options)
+    dbc_path = os.path.join(work_dir, f"benchmark_{msg_count}.dbc")
+    with open(dbc_path, "w") as f:
+        f.write(dbc_text)
+
+    results = {}
+    with _working_dir(work_dir):
+        prepared = _prepare_benchmarks(dbc_path, dbc_text, work_dir)
+        for name in benchmarks:
+            # Timed without tracemalloc, which slows allocation-heavy code down several times
+            result = {"wall_time": round(_time_it(prepared[name], repeat), 4)}
+            if measure_memory:
+                result["peak_memory"] = _peak_memory(prepared[name])
+            results[name] = result
+            print(f"{name} @ {msg_count}:".ljust(45), f"{result['wall_time']:.3f} s",
+                  f"{result['peak_memory'] / (1024 * 1024):.1f} MB" if measure_memory else "")
+    os.remove(dbc_path)
+    return len(dbc_text), results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes=None, benchmarks=None, repeat: int = 1, measure_memory: bool = True, **generator_options):
+    """
+    Times the parsing and export pipeline on generated DBCs of every size (in messages) and returns the
+    results as a JSON-serializable dict: wall time (best of repeat runs) and tracemalloc peak memory of
+    every benchmark, keyed by benchmark name and size.
+    """
+    sizes = sizes or DEFAULT_SIZES
+    benchmarks = benchmarks or BENCHMARK_NAMES
+    unknown = set(benchmarks) - set(BENCHMARK_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    report = {
+        "environment": {
+            "commit": _git_commit(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+        },
+        "generator": dict(generator_options),
+        "repeat": repeat,
+        "dbc_bytes": {},
+        "results": {name: {} for name in benchmarks},
+    }
+    with tempfile.TemporaryDirectory() as work_dir:
+        for msg_count in sizes:
+            dbc_bytes, results = _run_suite_size(msg_count, benchmarks, repeat, measure_memory, generator_options,
+                                                 work_dir)
+            report["dbc_bytes"][str(msg_count)] = dbc_bytes
+            for name, result in results.items():
+                report["results"][name][str(msg_count)] = result
+    return report
+
+
+def find_regressions(baseline: dict, current: dict, threshold: float = 0.1):
+    """Returns (benchmark, size, metric, baseline value, current value) of every metric grown by more than threshold."""
+    regressions = []
+    for name, sizes in current["results"].items():
+        for size, result in sizes.items():
+            baseline_result = baseline.get("results", {}).get(name, {}).get(size, {})
+            for metric, value in result.items():
+                baseline_value = baseline_result.get(metric)
+                if baseline_value and value > baseline_value * (1 + threshold):
+                    regressions.append((name, size, metric, baseline_value, value))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="dbc_benchmark",
+        description="Benchmarks the DBC parsing and export pipeline on generated DBC files"
+    )
+    parser.add_argument("-s", "--sizes", type=str, default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma separated DBC sizes, in messages")
+    parser.add_argument("-b", "--benchmarks", type=str, default=",".join(BENCHMARK_NAMES),
+                        help="Comma separated benchmarks to run")
+    parser.add_argument("-r", "--repeat", type=int, default=1)
+    parser.add_argument("-o", "--output", type=str, default="benchmark_results.json")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory measurement runs")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="Results of an earlier run; exits with an error if a metric regressed")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed relative growth over the baseline")
+    parser.add_argument("--signals", type=int, default=8, help="Maximum number of signals per message")
+    parser.add_argument("--nodes", type=int, default=10)
+    parser.add_argument("--val-ratio", type=float, default=0.3)
+    parser.add_argument("--comment-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", type=int, default=None, metavar="MESSAGES",
+                        help="Only compare the regex parser with the tokenizer on a DBC of this many messages")
+    parser.add_argument("--memory", action="store_true",
+                        help="With --compare, also compare the memory of the parsed models")
+    args = parser.parse_args()
+
+    generator_options = dict(signals_per_msg=args.signals, node_count=args.nodes, val_table_ratio=args.val_ratio,
+                             comment_ratio=args.comment_ratio, seed=args.seed)
+
+    if args.compare:
+        text = generate_dbc(args.compare, **generator_options)
+        regex_time, tokenizer_time = compare_parsers(text, args.repeat)
+        print(f"DBC size: {len(text) / (1024 * 1024):.2f} MB, messages: {args.compare}")
+        print("Regex parser:".ljust(30), f"{regex_time:.3f} s")
+        print("Streaming tokenizer:".ljust(30), f"{tokenizer_time:.3f} s")
+        print("Speedup:".ljust(30), f"{regex_time / tokenizer_time:.2f}x")
+
+        if args.memory:
+            model_size, table_size, model_peak, table_peak = compare_memory(text)
+            print("Dataclass model:".ljust(30), f"{model_size / (1024 * 1024):.2f} MB "
+                                                f"(peak {model_peak / (1024 * 1024):.2f} MB)")
+            print("Signal table:".ljust(30), f"{table_size / (1024 * 1024):.2f} MB "
+                                             f"(peak {table_peak / (1024 * 1024):.2f} MB)")
+            print("Reduction:".ljust(30), f"{model_size / table_size:.2f}x")
+            print("Note: --compact builds the table from the full dataclass model, so the peak memory of a parse "
+                  "doesn't improve; only the memory kept afterwards does.")
+        sys.exit(0)
+
+    report = run_suite(sizes=[int(size) for size in args.sizes.split(",")], benchmarks=args.benchmarks.split(","),
+                       repeat=args.repeat, measure_memory=not args.no_memory, **generator_options)
+    with open(args.output, "w") as f:
+        # Sorted and indented, so that results of two commits can be compared with a plain diff
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(baseline, report, args.threshold)
+        for name, size, metric, baseline_value, value in regressions:
+            print(f"REGRESSION {name} @ {size} {metric}: {baseline_value} -> {value} "
+                  f"(+{(value / baseline_value - 1) * 100:.1f}%)")
+        sys.exit(1 if regressions else 0)
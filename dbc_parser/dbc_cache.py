@@ -0,0 +1,183 @@
+import contextlib
+import gc
+import hashlib
+import io
+import os
+import pathlib
+import pickle
+
+from instrumentation import logger, stage
+from tokenizer import tokenize_dbc
+from utils import CAN_Message, CAN_Signal, DBC_Content
+
+# Bump whenever the shape of the parsed model changes, so that stale entries are not unpickled
+CACHE_VERSION = 1
+CACHE_DIR_NAME = ".dbc_cache"
+CACHE_SUFFIX = ".dbc.pkl"
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+# What unpickling a truncated or otherwise damaged payload raises
+_CORRUPT_PAYLOAD_ERRORS = (pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError, IndexError,
+                           KeyError, ImportError)
+
+
+def _cache_dir_for(dbc_path: pathlib.Path, cache_dir=None):
+    if cache_dir is not None:
+        return pathlib.Path(cache_dir)
+    return dbc_path.parent / CACHE_DIR_NAME
+
+
+def _cache_file_for(dbc_path: pathlib.Path, cache_dir=None):
+    path_digest = hashlib.sha1(str(dbc_path.resolve()).encode()).hexdigest()
+    return _cache_dir_for(dbc_path, cache_dir) / f"{dbc_path.stem}_{path_digest[:16]}{CACHE_SUFFIX}"
+
+
+def encode_dbc_content(dbc_content: DBC_Content):
+    """Flattens the parsed model into plain tuples, which pickle far more compactly than dataclasses."""
+    messages = []
+    for msg in dbc_content.messages:
+        signals = [(sig.signal_name, sig.bit_start, sig.bit_len, sig.endianness, sig.unsigned, sig.scale,
+                    sig.offset, sig.min, sig.max, sig.unit, sig.receivers, sig.enums, sig.comment)
+                   for sig in msg.signals]
+        messages.append((msg.msg_name, msg.msg_id, msg.msg_len, msg.sender, signals, msg.transmitters,
+                         msg.comment))
+    return dbc_content.nodes, dbc_content.comment, messages
+
+
+def decode_dbc_content(data):
+    nodes, comment, messages = data
+    return DBC_Content(messages=[CAN_Message(msg_name, msg_id, msg_len, sender,
+                                             [CAN_Signal(*signal) for signal in signals], transmitters, msg_comment)
+                                 for msg_name, msg_id, msg_len, sender, signals, transmitters, msg_comment in messages],
+                       nodes=nodes, comment=comment)
+
+
+def _read_header(cache):
+    """Returns (version, size, mtime_ns, content_hash) stored in front of a cache entry open in cache, or None."""
+    try:
+        return pickle.load(cache)
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+        return None
+
+
+def _unpickle_payload(payload: bytes):
+    """Returns the DBC_Content of a payload, or None if the payload is corrupt or truncated."""
+    # The garbage collector would otherwise rescan the freshly built objects many times during the load
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return decode_dbc_content(pickle.loads(payload))
+    except _CORRUPT_PAYLOAD_ERRORS:
+        return None
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _write_entry(cache_file: pathlib.Path, header, payload: bytes):
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    with open(temp_file, "wb") as f:
+        pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.write(payload)
+    # Atomic replace, so that concurrent CI jobs never see a half written entry
+    os.replace(temp_file, cache_file)
+
+
+def _evict(cache_dir: pathlib.Path, max_bytes: int, keep: pathlib.Path):
+    """Removes the least recently used entries until the cache directory fits into max_bytes."""
+    entries = []
+    total_size = 0
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(CACHE_SUFFIX):
+            try:
+                stat = entry.stat()
+            except OSError:
+                # Already evicted by another process sharing the cache directory
+                continue
+            total_size += stat.st_size
+            if entry.name != keep.name:
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    for _, size, path in sorted(entries):
+        if total_size <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total_size -= size
+        except OSError:
+            pass
+
+
+def load_dbc(dbc_path, cache_dir=None, use_cache: bool = True, max_bytes: int = MAX_CACHE_BYTES):
+    """
+    Returns the parsed DBC_Content of a DBC file, taking it from the on-disk cache when possible.
+    An entry is reused when the size and mtime of the DBC are unchanged, or when they changed but
+    the content hash still matches. Otherwise the file is tokenized again and the entry rewritten.
+    """
+    dbc_path = pathlib.Path(dbc_path)
+    if not use_cache:
+        # Reading is interleaved with tokenizing here, so it is accounted for in the tokenize stage
+        with open(dbc_path) as f:
+            return tokenize_dbc(f)
+
+    stat = dbc_path.stat()
+    cache_file = _cache_file_for(dbc_path, cache_dir)
+    try:
+        cache = open(cache_file, "rb")
+    except OSError:
+        cache = None
+
+    # The entry is read through this one handle, closed before the entry is rewritten (Windows can't
+    # replace an open file)
+    with cache or contextlib.nullcontext():
+        header = _read_header(cache) if cache is not None else None
+        if not isinstance(header, tuple) or len(header) != 4 or header[0] != CACHE_VERSION:
+            header = None
+        elif header[1] == stat.st_size and header[2] == stat.st_mtime_ns:
+            with stage("cache load"):
+                dbc_content = _unpickle_payload(cache.read())
+            if dbc_content is not None:
+                os.utime(cache_file)
+                return dbc_content
+            logger.warning("Corrupt cache entry %s, parsing %s again", cache_file, dbc_path)
+            header = None
+
+        with stage("read"):
+            with open(dbc_path, "rb") as f:
+                raw_content = f.read()
+            new_hash = hashlib.sha256(raw_content).hexdigest()
+
+        dbc_content = None
+        if header is not None and header[3] == new_hash:
+            # Touched but not modified - the payload is kept as is, only the stored size and mtime are refreshed
+            with stage("cache load"):
+                payload = cache.read()
+                dbc_content = _unpickle_payload(payload)
+            if dbc_content is None:
+                logger.warning("Corrupt cache entry %s, parsing %s again", cache_file, dbc_path)
+
+    if dbc_content is None:
+        # Same decoding and newline handling as the text mode open() used without the cache; the corrupt or
+        # stale entry is replaced below
+        dbc_content = tokenize_dbc(io.TextIOWrapper(io.BytesIO(raw_content)))
+        payload = pickle.dumps(encode_dbc_content(dbc_content), protocol=pickle.HIGHEST_PROTOCOL)
+
+    with stage("cache store"):
+        _write_entry(cache_file, (CACHE_VERSION, stat.st_size, stat.st_mtime_ns, new_hash), payload)
+        _evict(cache_file.parent, max_bytes, keep=cache_file)
+    return dbc_content
+
+
+def invalidate_dbc(dbc_path, cache_dir=None):
+    cache_file = _cache_file_for(pathlib.Path(dbc_path), cache_dir)
+    if cache_file.exists():
+        cache_file.unlink()
+
+
+def clear_cache(cache_dir):
+    cache_dir = pathlib.Path(cache_dir)
+    if not cache_dir.is_dir():
+        return
+    for file in cache_dir.iterdir():
+        if file.name.endswith(CACHE_SUFFIX):
+            file.unlink()
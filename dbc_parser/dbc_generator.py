@@ -0,0 +1,108 @@
+import argparse
+import random
+
+UNITS = ["", "", "", "km/h", "rpm", "degC", "V", "A", "%", "m/s^2", "deg", "bar", "Nm"]
+BIT_LENGTHS = [1, 1, 2, 4, 8, 8, 12, 16, 16, 32]
+ENUM_LABELS = ["Off", "On", "Error", "Not available", "Init", "Active", "Passive", "Reserved"]
+
+
+def _signal_layout(rng: random.Random, msg_len: int, signal_count: int, little_endian: bool):
+    """Yields (start bit, bit length) of non-overlapping signals packed from the start of the payload."""
+    total_bits = msg_len * 8
+    position = 0
+    for _ in range(signal_count):
+        remaining = total_bits - position
+        if remaining <= 0:
+            return
+        bit_len = min(rng.choice(BIT_LENGTHS), remaining)
+        if little_endian:
+            yield position, bit_len
+        else:
+            # Motorola fields are packed from the MSB of the big-endian payload downwards
+            msb_position = total_bits - 1 - position
+            yield (msg_len - 1 - msb_position // 8) * 8 + msb_position % 8, bit_len
+        position += bit_len
+
+
+def generate_dbc(msg_count: int, signals_per_msg: int = 8, node_count: int = 10, val_table_ratio: float = 0.3,
+                 comment_ratio: float = 0.5, big_endian_ratio: float = 0.2, seed: int = 0):
+    """
+    Returns the text of a synthetic but valid DBC file: msg_count messages spread over node_count
+    sending/receiving nodes, up to signals_per_msg packed signals each, and VAL_/CM_/BO_TX_BU_ sections
+    for the given share of signals/messages. The same arguments always generate the same file.
+    """
+    rng = random.Random(seed)
+    nodes = [f"ECU_{index}" for index in range(node_count)]
+    lines = ['VERSION ""', "", "", "NS_ :", "    CM_", "    BA_DEF_", "    BA_", "    VAL_", "    BO_TX_BU_", "",
+             "BS_:", "", "BU_: " + " ".join(nodes), "", ""]
+
+    comments = []
+    tx_lines = []
+    val_lines = []
+    used_ids = set()
+    for msg_index in range(msg_count):
+        msg_id = rng.randrange(1, 0x7FF) if msg_index < 1500 and rng.random() < 0.5 else rng.randrange(0x800, 0x1FFFFFFF)
+        while msg_id in used_ids:
+            msg_id = rng.randrange(0x800, 0x1FFFFFFF)
+        used_ids.add(msg_id)
+        if msg_id > 0x7FF:
+            msg_id |= 0x80000000
+
+        # Names never contain "SG_", which the legacy regex parser strips from the signal lines
+        msg_name = f"Message_{msg_index}"
+        msg_len = rng.choice([8, 8, 8, 8, 6, 4, 2])
+        sender = rng.choice(nodes)
+        little_endian = rng.random() >= big_endian_ratio
+        lines.append(f"BO_ {msg_id} {msg_name}: {msg_len} {sender}")
+
+        for sig_index, (bit_start, bit_len) in enumerate(_signal_layout(rng, msg_len, signals_per_msg,
+                                                                        little_endian)):
+            signal_name = f"{msg_name}_Signal_{sig_index}"
+            unsigned = bit_len == 1 or rng.random() < 0.7
+            scale = rng.choice([1, 1, 0.1, 0.5, 0.01, 0.25])
+            offset = rng.choice([0, 0, 0, -40, -100])
+            raw_max = (1 << bit_len) - 1 if unsigned else (1 << (bit_len - 1)) - 1
+            raw_min = 0 if unsigned else -(1 << (bit_len - 1))
+            receivers = ",".join(rng.sample(nodes, rng.randint(1, min(3, len(nodes)))))
+            lines.append(f" SG_ {signal_name} : {bit_start}|{bit_len}@{1 if little_endian else 0}"
+                         f"{'+' if unsigned else '-'} ({scale},{offset}) "
+                         f"[{raw_min * scale + offset:g}|{raw_max * scale + offset:g}] "
+                         f"\"{rng.choice(UNITS)}\" {receivers}")
+
+            if rng.random() < comment_ratio:
+                comments.append(f'CM_ SG_ {msg_id} {signal_name} "Synthetic signal {sig_index} of {msg_name}";')
+            if bit_len <= 8 and rng.random() < val_table_ratio:
+                values = " ".join(f'{value} "{label}"' for value, label
+                                  in enumerate(ENUM_LABELS[:min(len(ENUM_LABELS), raw_max + 1)]))
+                val_lines.append(f"VAL_ {msg_id} {signal_name} {values} ;")
+        lines.append("")
+
+        if rng.random() < comment_ratio:
+            comments.append(f'CM_ BO_ {msg_id} "Synthetic message {msg_index}, {rng.choice([10, 20, 50, 100])} ms";')
+        if rng.random() < 0.1:
+            tx_lines.append(f"BO_TX_BU_ {msg_id} : {sender},{rng.choice(nodes)};")
+
+    return "\n".join(lines + tx_lines + [""] + comments + [""] + val_lines) + "\n"
+
+
+def write_dbc(dbc_path, msg_count: int, **kwargs):
+    with open(dbc_path, "w") as f:
+        f.write(generate_dbc(msg_count, **kwargs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="dbc_generator",
+        description="Generates a synthetic DBC file of a configurable size"
+    )
+    parser.add_argument("output", type=str)
+    parser.add_argument("-m", "--messages", type=int, default=1000)
+    parser.add_argument("-s", "--signals", type=int, default=8, help="Maximum number of signals per message")
+    parser.add_argument("-n", "--nodes", type=int, default=10)
+    parser.add_argument("--val-ratio", type=float, default=0.3, help="Share of short signals with a VAL_ table")
+    parser.add_argument("--comment-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_dbc(args.output, args.messages, signals_per_msg=args.signals, node_count=args.nodes,
+              val_table_ratio=args.val_ratio, comment_ratio=args.comment_ratio, seed=args.seed)
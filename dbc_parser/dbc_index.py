@@ -0,0 +1,103 @@
+from bisect import bisect_left, bisect_right
+
+from decoder import frame_key, lookup_frame
+
+# Placeholder node name used by DBC editors for messages and signals without a sender/receiver
+NO_NODE = "Vector__XXX"
+QUALIFIED_SEPARATOR = "::"
+
+
+class DBC_Index:
+    """
+    Lookup tables over the messages of one parsed DBC, built once after parsing. Messages are found by
+    (ID, is extended) or name and signals by their fully qualified "Message::Signal" name in O(1), node
+    queries use the BO_ senders, BO_TX_BU_ transmitters and SG_ receivers, and signal names (without the
+    message part) can be searched by prefix (O(log n) over a sorted list) or by case-insensitive substring.
+    """
+
+    def __init__(self, can_messages, nodes=None):
+        self.by_id = {}
+        self.by_name = {}
+        self.signals = {}
+        self.sent_by = {}
+        self.received_by = {}
+        self.nodes = list(nodes) if nodes else []
+
+        for can_msg in can_messages:
+            self.by_id[frame_key(can_msg.msg_id)] = can_msg
+            self.by_name[can_msg.msg_name] = can_msg
+
+            senders = {can_msg.sender, *(can_msg.transmitters or [])}
+            for node in senders - {NO_NODE}:
+                self.sent_by.setdefault(node, []).append(can_msg)
+
+            receivers = set()
+            for signal in can_msg.signals:
+                self.signals[f"{can_msg.msg_name}{QUALIFIED_SEPARATOR}{signal.signal_name}"] = signal
+                receivers.update(signal.receivers)
+            for node in receivers - {NO_NODE}:
+                self.received_by.setdefault(node, []).append(can_msg)
+
+        # (lower case signal name, qualified name) pairs sorted for prefix searches
+        self._sorted_names = sorted((qualified_name.partition(QUALIFIED_SEPARATOR)[2].lower(), qualified_name)
+                                    for qualified_name in self.signals)
+        self._sorted_keys = [name for name, _ in self._sorted_names]
+        # One newline separated blob, so that substring search runs in str.find instead of a Python loop
+        self._search_blob = "\n".join(self._sorted_keys)
+        self._blob_offsets = []
+        offset = 0
+        for name in self._sorted_keys:
+            self._blob_offsets.append(offset)
+            offset += len(name) + 1
+
+    def get_message(self, msg_id_or_name, is_extended: bool = None):
+        """
+        Returns the message of a name or ID. Without is_extended, an ID with the DBC extended flag is looked
+        up as extended, and one without it as standard, then as extended (loggers drop the flag).
+        """
+        if isinstance(msg_id_or_name, str):
+            return self.by_name.get(msg_id_or_name)
+        return lookup_frame(self.by_id, msg_id_or_name, is_extended)
+
+    def get_signal(self, qualified_name: str):
+        """Returns the signal of a "Message::Signal" name, or None."""
+        return self.signals.get(qualified_name)
+
+    def messages_sent_by(self, node: str):
+        return list(self.sent_by.get(node, []))
+
+    def messages_received_by(self, node: str):
+        return list(self.received_by.get(node, []))
+
+    def search_prefix(self, prefix: str, limit: int = None):
+        """Returns the qualified names of the signals whose name starts with prefix (case-insensitive)."""
+        if limit is not None and limit <= 0:
+            return []
+        prefix = prefix.lower()
+        start = bisect_left(self._sorted_keys, prefix)
+        end = bisect_right(self._sorted_keys, prefix + "\uffff", lo=start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return [qualified_name for _, qualified_name in self._sorted_names[start:end]]
+
+    def search_substring(self, text: str, limit: int = None):
+        """
+        Returns the qualified names of the signals whose name contains text (case-insensitive), in the order
+        of the signal names.
+        """
+        text = text.lower()
+        if not text or "\n" in text or (limit is not None and limit <= 0):
+            return []
+        found = []
+        position = self._search_blob.find(text)
+        while position != -1:
+            index = bisect_right(self._blob_offsets, position) - 1
+            found.append(self._sorted_names[index][1])
+            if limit is not None and len(found) >= limit:
+                break
+            # Continues after the matched name, so every signal is reported once
+            next_offset = self._blob_offsets[index + 1] if index + 1 < len(self._blob_offsets) else None
+            if next_offset is None:
+                break
+            position = self._search_blob.find(text, next_offset)
+        return found
@@ -1,7 +1,15 @@
+import argparse
+import logging
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 
-from regexes import CAN_MSG_REGEX, BU_REGEX, BO_TX_BU_REGEX, CM_REGEX, VAL_REGEX
-from utils import CAN_dbc, CAN_Signal, write_data_to_xlsx, CAN_Message
+from regexes import CAN_MSG_REGEX, VAL_REGEX
+from signal_table import SignalTable
+from dbc_cache import load_dbc, invalidate_dbc, encode_dbc_content, decode_dbc_content
+from dbc_index import DBC_Index
+from instrumentation import RUN_REPORT, logger, stage, count, instrumented_run
+from utils import CAN_dbc, CAN_Signal, write_data_to_xlsx, write_data_to_xlsx_streaming, CAN_Message
 
 DBC_PATHS = [
     CAN_dbc(name="Sample DBC",
@@ -11,6 +19,15 @@ DBC_PATHS = [
 PARSED_OBJECTS = {
 }
 
+PARSED_NODES = {
+}
+
+PARSED_TABLES = {
+}
+
+PARSED_INDEXES = {
+}
+
 
 def _process_CAN_Message(can_msg_data: str):
     msg_part, signal_part = can_msg_data
@@ -39,7 +56,7 @@ def _process_CAN_Signal(signals: str):
     bit_start = bit_start_len_endian.split("|")[0]
     bit_len, endian, unsigned = re.findall(r"(\d+)@(\d+)([+-])", bit_start_len_endian.split("|")[1])[0]
 
-    endianness = "little-endian" if endian else "big-endian"
+    endianness = "little-endian" if endian == "1" else "big-endian"
 
     if unsigned[0] == "+":
         is_unsigned = True
@@ -96,48 +113,142 @@ def read_CAN_messages(dbc_name: str, dbc_text: str):
     return temp_list
 
 
-def parse_dbcs(dbc_list):
-    for can_dbc in dbc_list:
-        try:
-            PARSED_OBJECTS[can_dbc.name]
-        except KeyError:
-            PARSED_OBJECTS[can_dbc.name] = []
-
-        with open(can_dbc.dbc_path) as f:
-            dbc_text = f.read()
-
-        # can_msgs = re.findall(CAN_MSG_REGEX, dbc_text, flags=re.MULTILINE)
-        # bu = re.findall(BU_REGEX, dbc_text, flags=re.MULTILINE)
-        # bo_tx_bu = re.findall(BO_TX_BU_REGEX, dbc_text, flags=re.MULTILINE)
-        # comments = re.findall(CM_REGEX, dbc_text, flags=re.MULTILINE)
+def read_dbc_regex(dbc_name: str, dbc_text: str):
+    """Legacy multi-pass parser running the full-text regexes; kept as a reference for the benchmarks."""
+    with stage("message parse"):
+        can_messages = read_CAN_messages(dbc_name, dbc_text)
+    with stage("value-table parse"):
         values = re.findall(VAL_REGEX, dbc_text, flags=re.MULTILINE)
-
-        PARSED_OBJECTS[can_dbc.name] = read_CAN_messages(can_dbc.name, dbc_text)
         signal_val_dict = _process_signal_values(values)
 
-        for can_msg in PARSED_OBJECTS[can_dbc.name]:
+    with stage("enum merge"):
+        for can_msg in can_messages:
             msg_signal_values = signal_val_dict.get(can_msg.msg_id)
             if msg_signal_values:
                 for signal in can_msg.signals:
                     signal.enums = msg_signal_values.get(signal.signal_name)
+    return can_messages
+
+
+def _load_dbc_in_worker(dbc_path, cache_dir, use_cache):
+    # Plain tuples are much cheaper to send back to the parent process than the dataclasses
+    return encode_dbc_content(load_dbc(dbc_path, cache_dir=cache_dir, use_cache=use_cache))
+
+
+def load_dbcs(dbc_list, workers: int = 1, use_cache: bool = True, cache_dir=None):
+    """
+    Parses every CAN_dbc of the list, on a process pool of the given size when workers > 1.
+    Returns two dicts keyed by DBC name: the parsed DBC_Content objects, in the order of dbc_list,
+    and the exceptions of the files that couldn't be parsed.
+    """
+    parsed = {}
+    errors = {}
+    if workers > 1 and len(dbc_list) > 1:
+        # Stages timed inside the worker processes are not reported back, only the overall wall time
+        with stage("parallel parse"), ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [(can_dbc, executor.submit(_load_dbc_in_worker, can_dbc.dbc_path, cache_dir, use_cache))
+                       for can_dbc in dbc_list]
+            # Collected in submission order, so the result doesn't depend on which worker finishes first
+            for can_dbc, future in futures:
+                try:
+                    parsed[can_dbc.name] = decode_dbc_content(future.result())
+                except Exception as e:
+                    errors[can_dbc.name] = e
+    else:
+        for can_dbc in dbc_list:
+            try:
+                parsed[can_dbc.name] = load_dbc(can_dbc.dbc_path, cache_dir=cache_dir, use_cache=use_cache)
+            except Exception as e:
+                errors[can_dbc.name] = e
+    return parsed, errors
+
+
+def parse_dbcs(dbc_list, use_cache: bool = True, cache_dir=None, workers: int = 1, compact: bool = False,
+               streaming_export: bool = False):
+    parsed, errors = load_dbcs(dbc_list, workers=workers, use_cache=use_cache, cache_dir=cache_dir)
+    for dbc_name, error in errors.items():
+        logger.error("Couldn't parse DBC %s: %r", dbc_name, error)
+    for can_dbc in dbc_list:
+        if can_dbc.name in parsed:
+            count("bytes", os.path.getsize(can_dbc.dbc_path))
+
+    for dbc_name, dbc_content in parsed.items():
+        if compact:
+            # Messages become views over the array-backed table instead of per-signal dataclass objects
+            PARSED_TABLES[dbc_name] = SignalTable(dbc_content)
+            PARSED_OBJECTS[dbc_name] = PARSED_TABLES[dbc_name].messages()
+        else:
+            PARSED_OBJECTS[dbc_name] = dbc_content.messages
+        PARSED_NODES[dbc_name] = dbc_content.nodes
+        PARSED_INDEXES[dbc_name] = DBC_Index(PARSED_OBJECTS[dbc_name], dbc_content.nodes)
+
+        count("messages", len(dbc_content.messages))
+        for can_msg in dbc_content.messages:
+            count("signals", len(can_msg.signals))
+            count("enums", sum(len(signal.enums) for signal in can_msg.signals if signal.enums))
+        logger.info("Parsed DBC %s", dbc_name)
+
+    # The full dump costs more than the parsing itself on large DBCs, so it is only built in debug mode
+    if logger.isEnabledFor(logging.DEBUG):
+        for can_dbc in PARSED_OBJECTS:
+            logger.debug("*" * 50)
+            logger.debug("CAN DBC %s", can_dbc)
+            logger.debug("*" * 50)
+            sig_separator = "-" * 5 + ">"
+            for can_msg in PARSED_OBJECTS[can_dbc]:
+                logger.debug(can_msg)
+                for signal in can_msg.signals:
+                    logger.debug("%s %s", sig_separator, signal)
+                    if signal.enums:
+                        logger.debug("%s %s", sig_separator, signal.enums)
 
-        for can_msg in PARSED_OBJECTS[can_dbc.name]:
-            for signal in can_msg.signals:
-                print(signal.signal_name)
-                print(signal.enums)
-
-    for can_dbc in PARSED_OBJECTS:
-        print("*" * 50)
-        print(f"CAN DBC {can_dbc}")
-        print("*" * 50)
-        sig_separator = "-" * 5 + ">"
-        for can_msg in PARSED_OBJECTS[can_dbc]:
-            print(can_msg)
-            for signal in can_msg.signals:
-                print(sig_separator, signal)
-
-    write_data_to_xlsx(r"dbc_output_new.xlsx", PARSED_OBJECTS)
+    with stage("export"):
+        if streaming_export:
+            write_data_to_xlsx_streaming(r"dbc_output_new.xlsx", PARSED_OBJECTS)
+        else:
+            write_data_to_xlsx(r"dbc_output_new.xlsx", PARSED_OBJECTS)
+    return errors
 
 
 if __name__ == "__main__":
-    parse_dbcs(DBC_PATHS)
+    parser = argparse.ArgumentParser(
+        prog="dbc_parser",
+        description="Parses DBC files and exports their messages, signals and enums to Excel"
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Always reparse, bypassing the parsed-DBC cache")
+    parser.add_argument("--cache-dir", type=str, default=None,
+                        help="Cache directory (defaults to .dbc_cache next to every DBC)")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="Number of worker processes used to parse the DBCs in parallel")
+    parser.add_argument("--compact", action="store_true",
+                        help="Keep the parsed signals in array-backed tables instead of dataclass objects (the "
+                             "dataclass model is still built first, so the peak memory doesn't improve)")
+    parser.add_argument("--streaming-export", action="store_true",
+                        help="Export through a write-only workbook, keeping memory flat for large DBCs")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Dump every parsed message and signal")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only report warnings and errors")
+    parser.add_argument("--report", type=str, default=None, help="Write a JSON run report to this path")
+    parser.add_argument("--profile", type=str, default=None, help="Run under cProfile and dump the stats here")
+    parser.add_argument("--trace-memory", action="store_true", help="Record peak memory with tracemalloc")
+    parser.add_argument("--invalidate-cache", action="store_true",
+                        help="Drop the cached entries of the parsed DBCs before parsing")
+    args = parser.parse_args()
+
+    if args.verbose:
+        log_level = logging.DEBUG
+    elif args.quiet:
+        log_level = logging.WARNING
+    else:
+        log_level = logging.INFO
+    logging.basicConfig(level=log_level, format="%(message)s")
+
+    if args.invalidate_cache:
+        for dbc in DBC_PATHS:
+            invalidate_dbc(dbc.dbc_path, cache_dir=args.cache_dir)
+
+    with instrumented_run(profile_path=args.profile, trace_memory=args.trace_memory):
+        parse_dbcs(DBC_PATHS, use_cache=not args.no_cache, cache_dir=args.cache_dir, workers=args.workers,
+                   compact=args.compact, streaming_export=args.streaming_export)
+    RUN_REPORT.log_summary()
+    if args.report:
+        RUN_REPORT.to_json(args.report)
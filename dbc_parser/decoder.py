@@ -0,0 +1,128 @@
+from utils import CAN_Message, CAN_Signal
+
+# Extended (29-bit) frame IDs are stored in DBC files with the most significant bit set
+EXTENDED_ID_FLAG = 0x80000000
+EXTENDED_ID_MASK = 0x1FFFFFFF
+
+
+def frame_key(msg_id: int):
+    """(frame ID, is extended) key of a DBC message ID - a standard and an extended frame may share the ID."""
+    return msg_id & EXTENDED_ID_MASK, bool(msg_id & EXTENDED_ID_FLAG)
+
+
+def lookup_frame(table: dict, msg_id: int, is_extended: bool = None):
+    """
+    Looks up a frame in a dict keyed by frame_key. Without is_extended, an ID with the DBC extended flag is
+    looked up as extended, and one without it as standard, then as extended (loggers drop the flag).
+    """
+    if is_extended is not None:
+        return table.get((msg_id & EXTENDED_ID_MASK, is_extended))
+    if msg_id & EXTENDED_ID_FLAG:
+        return table.get((msg_id & EXTENDED_ID_MASK, True))
+    return table.get((msg_id, False)) or table.get((msg_id, True))
+
+
+def signal_shift(signal: CAN_Signal, msg_len: int):
+    """
+    Returns the right shift which brings the signal's least significant bit to bit 0 of the payload
+    read as an integer - little-endian for Intel signals, big-endian for Motorola ones.
+    """
+    if signal.endianness == "little-endian":
+        return signal.bit_start
+    # Motorola start bits point to the MSB, counted within the byte from bit 7 down to bit 0
+    msb_position = (msg_len - 1 - signal.bit_start // 8) * 8 + signal.bit_start % 8
+    return msb_position - signal.bit_len + 1
+
+
+def enum_choices(signal: CAN_Signal):
+    if not signal.enums:
+        return None
+    return {int(value): label for value, label in signal.enums}
+
+
+class MessageDecoder:
+    """Decode plan of a single CAN message, precomputed once from its CAN_Message definition."""
+    __slots__ = ("msg_name", "msg_id", "msg_len", "names", "plan", "needs_little", "needs_big")
+
+    def __init__(self, can_message: CAN_Message):
+        self.msg_name = can_message.msg_name
+        self.msg_id = can_message.msg_id
+        self.msg_len = can_message.msg_len
+        self.names = tuple(signal.signal_name for signal in can_message.signals)
+
+        plan = []
+        for signal in can_message.signals:
+            is_little = signal.endianness == "little-endian"
+            shift = signal_shift(signal, self.msg_len)
+            if shift < 0:
+                raise ValueError(f"Signal {signal.signal_name} doesn't fit into {self.msg_name} "
+                                 f"({self.msg_len} bytes)")
+            sign_bit = 0 if signal.unsigned else 1 << (signal.bit_len - 1)
+            # Integer signals without scaling keep their raw value instead of turning into floats
+            identity = signal.scale == 1 and signal.offset == 0
+            plan.append((signal.signal_name, is_little, shift, (1 << signal.bit_len) - 1, sign_bit,
+                         None if identity else signal.scale, signal.offset, enum_choices(signal)))
+        self.plan = tuple(plan)
+        self.needs_little = any(step[1] for step in plan)
+        self.needs_big = not all(step[1] for step in plan)
+
+    def decode_raw(self, payload):
+        """Returns the raw (unscaled) signal values, in the order of the message's signals."""
+        if len(payload) != self.msg_len:
+            payload = bytes(payload[:self.msg_len]).ljust(self.msg_len, b"\x00")
+        little = int.from_bytes(payload, "little") if self.needs_little else 0
+        big = int.from_bytes(payload, "big") if self.needs_big else 0
+
+        values = []
+        for _, is_little, shift, mask, sign_bit, _, _, _ in self.plan:
+            raw = ((little if is_little else big) >> shift) & mask
+            if raw & sign_bit:
+                raw -= sign_bit << 1
+            values.append(raw)
+        return values
+
+    def decode(self, payload, decode_choices: bool = True):
+        """Returns {signal name: physical value}, or the enum label for values listed in a VAL_ table."""
+        if len(payload) != self.msg_len:
+            payload = bytes(payload[:self.msg_len]).ljust(self.msg_len, b"\x00")
+        little = int.from_bytes(payload, "little") if self.needs_little else 0
+        big = int.from_bytes(payload, "big") if self.needs_big else 0
+
+        decoded = {}
+        for name, is_little, shift, mask, sign_bit, scale, offset, choices in self.plan:
+            raw = ((little if is_little else big) >> shift) & mask
+            if raw & sign_bit:
+                raw -= sign_bit << 1
+            if choices is not None and decode_choices:
+                label = choices.get(raw)
+                if label is not None:
+                    decoded[name] = label
+                    continue
+            decoded[name] = raw if scale is None else raw * scale + offset
+        return decoded
+
+
+class CAN_Decoder:
+    """Decodes (msg_id, payload) frames using the messages of one or more parsed DBCs."""
+
+    def __init__(self, can_messages):
+        self.decoders = {}
+        for can_message in can_messages:
+            self.decoders[frame_key(can_message.msg_id)] = MessageDecoder(can_message)
+
+    @classmethod
+    def from_parsed_objects(cls, parsed_objects: dict):
+        return cls(can_message for messages in parsed_objects.values() for can_message in messages)
+
+    def get_message_decoder(self, msg_id: int, is_extended: bool = None):
+        return lookup_frame(self.decoders, msg_id, is_extended)
+
+    def decode(self, msg_id: int, payload, decode_choices: bool = True, is_extended: bool = None):
+        """
+        Returns the decoded signals of a frame, or None when the ID is not defined in the DBCs. The frame
+        type is taken from is_extended, else from the ID as in lookup_frame.
+        """
+        message_decoder = lookup_frame(self.decoders, msg_id, is_extended)
+        if message_decoder is None:
+            return None
+        return message_decoder.decode(payload, decode_choices)
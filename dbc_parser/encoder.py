@@ -0,0 +1,110 @@
+from decoder import frame_key, lookup_frame, signal_shift
+from utils import CAN_Message
+
+
+class MessageEncoder:
+    """
+    Pack plan of a single CAN message, precomputed once from its CAN_Message definition.
+    Signals missing from the encoded values are sent as raw 0.
+    """
+    __slots__ = ("msg_name", "msg_id", "msg_len", "plan", "has_little", "has_big")
+
+    def __init__(self, can_message: CAN_Message):
+        self.msg_name = can_message.msg_name
+        self.msg_id = can_message.msg_id
+        self.msg_len = can_message.msg_len
+
+        plan = []
+        for signal in can_message.signals:
+            is_little = signal.endianness == "little-endian"
+            shift = signal_shift(signal, self.msg_len)
+            if shift < 0:
+                raise ValueError(f"Signal {signal.signal_name} doesn't fit into {self.msg_name} "
+                                 f"({self.msg_len} bytes)")
+            if signal.unsigned:
+                raw_min, raw_max = 0, (1 << signal.bit_len) - 1
+            else:
+                raw_min, raw_max = -(1 << (signal.bit_len - 1)), (1 << (signal.bit_len - 1)) - 1
+            # DBC files commonly use [0|0] for signals without a defined range
+            if signal.min < signal.max:
+                phys_min, phys_max = signal.min, signal.max
+            else:
+                phys_min, phys_max = float("-inf"), float("inf")
+            labels = {label: int(value) for value, label in signal.enums} if signal.enums else None
+            plan.append((signal.signal_name, is_little, shift, (1 << signal.bit_len) - 1, raw_min, raw_max,
+                         phys_min, phys_max, signal.scale, signal.offset, labels))
+        self.plan = tuple(plan)
+        self.has_little = any(step[1] for step in plan)
+        self.has_big = not all(step[1] for step in plan)
+
+    def encode_int(self, values: dict):
+        """Returns the packed payload as a pair of (little-endian, big-endian) integers."""
+        little = 0
+        big = 0
+        for name, is_little, shift, mask, raw_min, raw_max, phys_min, phys_max, scale, offset, labels in self.plan:
+            value = values.get(name)
+            if value is None:
+                continue
+            if value.__class__ is str:
+                if labels is None or value not in labels:
+                    raise ValueError(f"{value!r} is not a value of {self.msg_name}::{name}")
+                raw = labels[value]
+            else:
+                if value < phys_min:
+                    value = phys_min
+                elif value > phys_max:
+                    value = phys_max
+                raw = round((value - offset) / scale)
+            if raw < raw_min:
+                raw = raw_min
+            elif raw > raw_max:
+                raw = raw_max
+            raw = (raw & mask) << shift
+            if is_little:
+                little |= raw
+            else:
+                big |= raw
+        return little, big
+
+    def encode(self, values: dict):
+        """Returns the msg_len-byte payload for {signal name: physical value or enum label}."""
+        little, big = self.encode_int(values)
+        if not self.has_big:
+            return little.to_bytes(self.msg_len, "little")
+        if not self.has_little:
+            return big.to_bytes(self.msg_len, "big")
+        # Mixed byte orders - the Motorola part is byte swapped into the little-endian integer
+        little |= int.from_bytes(big.to_bytes(self.msg_len, "big"), "little")
+        return little.to_bytes(self.msg_len, "little")
+
+    def encode_into(self, values: dict, buffer: bytearray, offset: int = 0):
+        """Writes the payload into a preallocated buffer, e.g. the frame buffer of a periodic transmission."""
+        buffer[offset:offset + self.msg_len] = self.encode(values)
+
+
+class CAN_Encoder:
+    """Encodes physical signal values into frame payloads for the messages of one or more parsed DBCs."""
+
+    def __init__(self, can_messages):
+        self.encoders = {}
+        self.encoders_by_name = {}
+        for can_message in can_messages:
+            message_encoder = MessageEncoder(can_message)
+            self.encoders[frame_key(can_message.msg_id)] = message_encoder
+            self.encoders_by_name[can_message.msg_name] = message_encoder
+
+    @classmethod
+    def from_parsed_objects(cls, parsed_objects: dict):
+        return cls(can_message for messages in parsed_objects.values() for can_message in messages)
+
+    def get_message_encoder(self, msg_id_or_name, is_extended: bool = None):
+        """Encoder of a message name or ID; IDs are resolved like in lookup_frame. Raises KeyError if unknown."""
+        if isinstance(msg_id_or_name, str):
+            return self.encoders_by_name[msg_id_or_name]
+        message_encoder = lookup_frame(self.encoders, msg_id_or_name, is_extended)
+        if message_encoder is None:
+            raise KeyError(msg_id_or_name)
+        return message_encoder
+
+    def encode(self, msg_id_or_name, values: dict, is_extended: bool = None):
+        return self.get_message_encoder(msg_id_or_name, is_extended).encode(values)
@@ -1,5 +1,8 @@
+from instrumentation import logger
+
+
 def auto_adjust_column_width(sheet):
-    print("Sheet name:", sheet.title)
+    logger.debug("Sheet name: %s", sheet.title)
     for column in sheet.columns:
         max_length = 0
         column_letter = column[0].column_letter
@@ -11,5 +14,4 @@ def auto_adjust_column_width(sheet):
                 pass
         adjusted_width = max_length
         sheet.column_dimensions[column_letter].width = adjusted_width
-        print("Column:", column_letter)
-        print("Adjusted width:", max_length)
\ No newline at end of file
+        logger.debug("Column: %s adjusted width: %s", column_letter, max_length)
\ No newline at end of file
@@ -0,0 +1,83 @@
+import cProfile
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+
+logger = logging.getLogger("dbc_parser")
+
+
+@dataclass
+class RunReport:
+    stages: dict = field(default_factory=dict)
+    counters: dict = field(default_factory=dict)
+    peak_memory: int = None
+    total_time: float = None
+
+    def add_time(self, stage_name: str, elapsed: float):
+        self.stages[stage_name] = self.stages.get(stage_name, 0.0) + elapsed
+
+    def count(self, counter_name: str, value: int = 1):
+        self.counters[counter_name] = self.counters.get(counter_name, 0) + value
+
+    def reset(self):
+        self.stages.clear()
+        self.counters.clear()
+        self.peak_memory = None
+        self.total_time = None
+
+    def to_json(self, json_path):
+        with open(json_path, "w") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    def log_summary(self):
+        for stage_name, elapsed in self.stages.items():
+            logger.info("%s %.4f s", f"{stage_name}:".ljust(30), elapsed)
+        for counter_name, value in self.counters.items():
+            logger.info("%s %d", f"{counter_name}:".ljust(30), value)
+        if self.peak_memory is not None:
+            logger.info("%s %.2f MB", "peak memory:".ljust(30), self.peak_memory / (1024 * 1024))
+
+
+# Report of the current run, filled by the pipeline stages of every module
+RUN_REPORT = RunReport()
+
+
+@contextmanager
+def stage(stage_name: str):
+    """Adds the wall time spent in the block to the given stage of RUN_REPORT."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        RUN_REPORT.add_time(stage_name, time.perf_counter() - start)
+
+
+def count(counter_name: str, value: int = 1):
+    RUN_REPORT.count(counter_name, value)
+
+
+@contextmanager
+def instrumented_run(profile_path=None, trace_memory: bool = False):
+    """
+    Measures a whole run into RUN_REPORT, optionally under cProfile (stats dumped to profile_path,
+    e.g. for snakeviz or pstats) and tracemalloc (peak traced memory stored in the report).
+    """
+    profiler = cProfile.Profile() if profile_path else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield RUN_REPORT
+    finally:
+        RUN_REPORT.total_time = time.perf_counter() - start
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if trace_memory:
+            RUN_REPORT.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
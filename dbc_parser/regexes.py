@@ -3,3 +3,12 @@ BU_REGEX = r"^(BU_:\s(.*))"
 BO_TX_BU_REGEX = r"^(?:BO_TX_BU_\s)(.*);$"
 CM_REGEX = r"^(?:CM_\s)(.*);$"
 VAL_REGEX = r"^(?:VAL_\s)(.*);$"
+
+# Line-level patterns used by the streaming tokenizer (one match per line)
+BO_LINE_REGEX = r"^BO_\s+(\d+)\s+(\w+)\s*:\s*(\d+)\s+(\w+)"
+SG_LINE_REGEX = (r"^SG_\s+(\w+)\s*(?:M|m\d+M?)?\s*:\s*(\d+)\|(\d+)@([01])([+-])\s*"
+                 r"\(([^,]+),([^)]+)\)\s*\[([^|]+)\|([^\]]+)\]\s*\"([^\"]*)\"\s*(.*)$")
+VAL_LINE_REGEX = r"^VAL_\s+(\d+)\s+(\w+)\s+(.*);"
+VAL_PAIR_REGEX = r"(-?\d+)\s+\"([^\"]*)\""
+BO_TX_BU_LINE_REGEX = r"^BO_TX_BU_\s+(\d+)\s*:\s*(.*?)\s*;"
+CM_LINE_REGEX = r"^CM_\s+(?:(BU_)\s+(\w+)\s+|(BO_)\s+(\d+)\s+|(SG_)\s+(\d+)\s+(\w+)\s+|(EV_)\s+(\w+)\s+)?\"(.*)\"\s*;"
@@ -0,0 +1,217 @@
+import sys
+from array import array
+
+from utils import CAN_Message, CAN_Signal, DBC_Content
+
+
+def _pool_index(pool: list, lookup: dict, value):
+    index = lookup.get(value)
+    if index is None:
+        index = lookup[value] = len(pool)
+        pool.append(value)
+    return index
+
+
+class SignalTable:
+    """
+    Struct-of-arrays storage of a parsed DBC. Numeric fields live in typed arrays, repeated strings
+    (units, senders, receiver lists) are stored once in pools and referenced by index, and the
+    sparse enum/comment data is kept in dicts keyed by signal index. Signals of message i occupy
+    indexes first_signal[i] to first_signal[i + 1] - 1.
+    """
+    __slots__ = ("msg_names", "msg_ids", "msg_lens", "senders", "first_signal", "msg_transmitters", "msg_comments",
+                 "signal_names", "bit_starts", "bit_lens", "little_endian", "unsigned", "scales", "offsets",
+                 "mins", "maxs", "units", "receivers", "enums", "signal_comments", "strings", "receiver_sets",
+                 "nodes", "comment")
+
+    def __init__(self, dbc_content: DBC_Content):
+        self.msg_names = []
+        self.msg_ids = array("L")
+        self.msg_lens = array("H")
+        self.senders = array("L")
+        self.first_signal = array("L", [0])
+        self.msg_transmitters = {}
+        self.msg_comments = {}
+
+        self.signal_names = []
+        self.bit_starts = array("H")
+        self.bit_lens = array("H")
+        self.little_endian = array("B")
+        self.unsigned = array("B")
+        self.scales = array("d")
+        self.offsets = array("d")
+        self.mins = array("d")
+        self.maxs = array("d")
+        self.units = array("L")
+        self.receivers = array("L")
+        self.enums = {}
+        self.signal_comments = {}
+
+        self.strings = []
+        self.receiver_sets = []
+        self.nodes = list(dbc_content.nodes)
+        self.comment = dbc_content.comment
+
+        string_lookup = {}
+        receiver_lookup = {}
+        for msg_index, can_msg in enumerate(dbc_content.messages):
+            self.msg_names.append(sys.intern(can_msg.msg_name))
+            self.msg_ids.append(can_msg.msg_id)
+            self.msg_lens.append(can_msg.msg_len)
+            self.senders.append(_pool_index(self.strings, string_lookup, can_msg.sender))
+            if can_msg.transmitters:
+                self.msg_transmitters[msg_index] = tuple(can_msg.transmitters)
+            if can_msg.comment is not None:
+                self.msg_comments[msg_index] = can_msg.comment
+
+            for signal in can_msg.signals:
+                signal_index = len(self.signal_names)
+                self.signal_names.append(sys.intern(signal.signal_name))
+                self.bit_starts.append(signal.bit_start)
+                self.bit_lens.append(signal.bit_len)
+                self.little_endian.append(signal.endianness == "little-endian")
+                self.unsigned.append(signal.unsigned)
+                self.scales.append(signal.scale)
+                self.offsets.append(signal.offset)
+                self.mins.append(signal.min)
+                self.maxs.append(signal.max)
+                self.units.append(_pool_index(self.strings, string_lookup, signal.unit))
+                self.receivers.append(_pool_index(self.receiver_sets, receiver_lookup, tuple(signal.receivers)))
+                if signal.enums:
+                    self.enums[signal_index] = tuple(signal.enums)
+                if signal.comment is not None:
+                    self.signal_comments[signal_index] = signal.comment
+            self.first_signal.append(len(self.signal_names))
+
+    def __len__(self):
+        return len(self.msg_names)
+
+    @property
+    def signal_count(self):
+        return len(self.signal_names)
+
+    def messages(self):
+        """Returns CAN_Message-like views, which existing callers can use in place of the dataclasses."""
+        return [MessageView(self, msg_index) for msg_index in range(len(self.msg_names))]
+
+    def to_dbc_content(self):
+        """Materializes the table back into regular CAN_Message/CAN_Signal dataclasses."""
+        messages = []
+        for view in self.messages():
+            signals = [CAN_Signal(signal.signal_name, signal.bit_start, signal.bit_len, signal.endianness,
+                                  signal.unsigned, signal.scale, signal.offset, signal.min, signal.max, signal.unit,
+                                  signal.receivers, signal.enums, signal.comment)
+                       for signal in view.signals]
+            messages.append(CAN_Message(view.msg_name, view.msg_id, view.msg_len, view.sender, signals,
+                                        view.transmitters, view.comment))
+        return DBC_Content(messages=messages, nodes=list(self.nodes), comment=self.comment)
+
+
+class SignalView:
+    """Read-only CAN_Signal view of one row of a SignalTable."""
+    __slots__ = ("table", "index")
+
+    def __init__(self, table: SignalTable, index: int):
+        self.table = table
+        self.index = index
+
+    @property
+    def signal_name(self):
+        return self.table.signal_names[self.index]
+
+    @property
+    def bit_start(self):
+        return self.table.bit_starts[self.index]
+
+    @property
+    def bit_len(self):
+        return self.table.bit_lens[self.index]
+
+    @property
+    def endianness(self):
+        return "little-endian" if self.table.little_endian[self.index] else "big-endian"
+
+    @property
+    def unsigned(self):
+        return bool(self.table.unsigned[self.index])
+
+    @property
+    def scale(self):
+        return self.table.scales[self.index]
+
+    @property
+    def offset(self):
+        return self.table.offsets[self.index]
+
+    @property
+    def min(self):
+        return self.table.mins[self.index]
+
+    @property
+    def max(self):
+        return self.table.maxs[self.index]
+
+    @property
+    def unit(self):
+        return self.table.strings[self.table.units[self.index]]
+
+    @property
+    def receivers(self):
+        return list(self.table.receiver_sets[self.table.receivers[self.index]])
+
+    @property
+    def enums(self):
+        enums = self.table.enums.get(self.index)
+        return list(enums) if enums is not None else None
+
+    @property
+    def comment(self):
+        return self.table.signal_comments.get(self.index)
+
+    __str__ = CAN_Signal.__str__
+    to_row = CAN_Signal.to_row
+    get_headers = CAN_Signal.get_headers
+
+
+class MessageView:
+    """Read-only CAN_Message view of one message of a SignalTable; its signals are SignalView objects."""
+    __slots__ = ("table", "index")
+
+    def __init__(self, table: SignalTable, index: int):
+        self.table = table
+        self.index = index
+
+    @property
+    def msg_name(self):
+        return self.table.msg_names[self.index]
+
+    @property
+    def msg_id(self):
+        return self.table.msg_ids[self.index]
+
+    @property
+    def msg_len(self):
+        return self.table.msg_lens[self.index]
+
+    @property
+    def sender(self):
+        return self.table.strings[self.table.senders[self.index]]
+
+    @property
+    def transmitters(self):
+        transmitters = self.table.msg_transmitters.get(self.index)
+        return list(transmitters) if transmitters is not None else None
+
+    @property
+    def comment(self):
+        return self.table.msg_comments.get(self.index)
+
+    @property
+    def signals(self):
+        first_signal = self.table.first_signal
+        return [SignalView(self.table, signal_index)
+                for signal_index in range(first_signal[self.index], first_signal[self.index + 1])]
+
+    __str__ = CAN_Message.__str__
+    to_row = CAN_Message.to_row
+    get_headers = CAN_Message.get_headers
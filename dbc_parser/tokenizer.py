@@ -0,0 +1,130 @@
+import re
+import sys
+
+from regexes import BO_LINE_REGEX, SG_LINE_REGEX, VAL_LINE_REGEX, VAL_PAIR_REGEX, BO_TX_BU_LINE_REGEX, \
+    CM_LINE_REGEX
+from instrumentation import stage
+from utils import CAN_Message, CAN_Signal, DBC_Content
+
+_BO_LINE = re.compile(BO_LINE_REGEX)
+_SG_LINE = re.compile(SG_LINE_REGEX)
+_VAL_LINE = re.compile(VAL_LINE_REGEX)
+_VAL_PAIR = re.compile(VAL_PAIR_REGEX)
+_BO_TX_BU_LINE = re.compile(BO_TX_BU_LINE_REGEX)
+_CM_LINE = re.compile(CM_LINE_REGEX, flags=re.DOTALL)
+
+
+def _parse_signal_line(line: str):
+    match = _SG_LINE.match(line)
+    if not match:
+        raise ValueError(f"Couldn't parse signal definition: {line}")
+    (signal_name, bit_start, bit_len, endian, sign, scale, offset,
+     min_val, max_val, unit, receivers) = match.groups()
+    # Positional arguments, in CAN_Signal field order - this runs once for every SG_ line.
+    # Units and node names repeat across thousands of signals, so a single interned copy is kept.
+    return CAN_Signal(signal_name, int(bit_start), int(bit_len),
+                      "little-endian" if endian == "1" else "big-endian", sign == "+",
+                      float(scale), float(offset), float(min_val), float(max_val),
+                      sys.intern(unit), [sys.intern(receiver) for receiver in receivers.replace(",", " ").split()])
+
+
+def _parse_message_line(line: str):
+    match = _BO_LINE.match(line)
+    if not match:
+        raise ValueError(f"Couldn't parse message definition: {line}")
+    id_msg, msg_name, msg_len, sender_name = match.groups()
+    return CAN_Message(msg_name=msg_name, msg_id=int(id_msg), msg_len=int(msg_len),
+                       sender=sys.intern(sender_name), signals=[])
+
+
+def _iter_statements(lines):
+    """Yields stripped DBC statements; a statement with an unterminated string spans several lines."""
+    pending = None
+    for line in lines:
+        if pending is not None:
+            pending += "\n" + line.rstrip("\r\n")
+            if not pending.count('"') & 1:
+                yield pending
+                pending = None
+            continue
+
+        line = line.strip()
+        if not line:
+            continue
+        if line.count('"') & 1:
+            pending = line
+            continue
+        yield line
+    if pending is not None:
+        yield pending
+
+
+def tokenize_dbc(lines):
+    """
+    Parses a DBC file in a single pass over its lines (an open file object or any iterable of strings).
+    Every statement is dispatched on its leading keyword, BO_/SG_ entries are built directly into
+    CAN_Message/CAN_Signal objects, while BU_, BO_TX_BU_, CM_ and VAL_ sections are merged into them
+    once the pass is over.
+    """
+    messages = []
+    nodes = []
+    db_comment = None
+    current_msg = None
+
+    msg_comments = {}
+    signal_comments = {}
+    signal_values = {}
+    transmitters = {}
+
+    with stage("tokenize"):
+        for statement in _iter_statements(lines):
+            if statement.startswith("SG_ "):
+                if current_msg is None:
+                    raise ValueError(f"Signal defined outside of a message: {statement}")
+                current_msg.signals.append(_parse_signal_line(statement))
+                continue
+
+            keyword = statement.split(None, 1)[0]
+            current_msg = None
+            if keyword == "BO_":
+                current_msg = _parse_message_line(statement)
+                messages.append(current_msg)
+            elif keyword == "VAL_":
+                match = _VAL_LINE.match(statement)
+                # VAL_ entries of environment variables carry no message ID and are not used here
+                if match:
+                    msg_id, signal_name, enum_part = match.groups()
+                    signal_values[(int(msg_id), signal_name)] = _VAL_PAIR.findall(enum_part)
+            elif keyword == "CM_":
+                match = _CM_LINE.match(statement)
+                if match:
+                    _, _, bo, bo_id, sg, sg_id, sg_name, _, _, text = match.groups()
+                    if sg:
+                        signal_comments[(int(sg_id), sg_name)] = text
+                    elif bo:
+                        msg_comments[int(bo_id)] = text
+                    elif not any(match.groups()[:-1]):
+                        db_comment = text
+            elif keyword == "BO_TX_BU_":
+                match = _BO_TX_BU_LINE.match(statement)
+                if match:
+                    msg_id, senders = match.groups()
+                    transmitters[int(msg_id)] = senders.replace(",", " ").split()
+            elif keyword in ("BU_", "BU_:"):
+                nodes.extend(statement.partition(":")[2].split())
+
+    with stage("enum merge"):
+        for can_msg in messages:
+            can_msg.comment = msg_comments.get(can_msg.msg_id)
+            can_msg.transmitters = transmitters.get(can_msg.msg_id)
+            for signal in can_msg.signals:
+                key = (can_msg.msg_id, signal.signal_name)
+                signal.enums = signal_values.get(key)
+                signal.comment = signal_comments.get(key)
+
+    return DBC_Content(messages=messages, nodes=nodes, comment=db_comment)
+
+
+def tokenize_dbc_file(dbc_path):
+    with open(dbc_path) as f:
+        return tokenize_dbc(f)
@@ -0,0 +1,241 @@
+import argparse
+import mmap
+import pathlib
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from batch_decoder import CAN_BatchDecoder
+from dbc_cache import load_dbc
+from decoder import EXTENDED_ID_FLAG, EXTENDED_ID_MASK
+
+CLASSIC_PAYLOAD_LEN = 8
+CANDUMP_SUFFIXES = (".log", ".candump")
+# candump writes standard IDs with 3 hex digits and extended ones with 8
+CANDUMP_STANDARD_ID_LEN = 3
+
+
+@dataclass
+class FrameChunk:
+    timestamps: np.ndarray
+    msg_ids: np.ndarray
+    payloads: np.ndarray
+    is_extended: np.ndarray
+
+    def __len__(self):
+        return len(self.msg_ids)
+
+
+@dataclass
+class TraceStats:
+    bytes_read: int = 0
+    lines_read: int = 0
+    frames_read: int = 0
+    frames_kept: int = 0
+    elapsed: float = 0.0
+
+    def __str__(self):
+        elapsed = self.elapsed or float("inf")
+        return (f"Frames read: {self.frames_read} kept: {self.frames_kept} in {self.elapsed:.2f} s - "
+                f"{self.frames_read / elapsed:.0f} frames/s, {self.bytes_read / (1024 * 1024) / elapsed:.1f} MB/s")
+
+
+def _parse_asc_line(tokens, base: int):
+    """
+    Vector ASC frame lines:
+        <time> <channel> <id>[x] Rx|Tx d <dlc> <data bytes...>
+        <time> CANFD <channel> Rx|Tx <id>[x] [<symbolic name>] <brs> <esi> <dlc> <data length> <data bytes...>
+    Returns (time, id, is extended, data tokens) or None for any other event (remote and error frames,
+    comments, statistics...).
+    """
+    if len(tokens) < 5:
+        return None
+    try:
+        timestamp = float(tokens[0])
+    except ValueError:
+        return None
+
+    if tokens[1] == "CANFD":
+        raw_id = tokens[4]
+        fields = tokens[5:]
+        if len(fields) > 4 and len(fields[0]) > 1:
+            # Skips the optional symbolic message name
+            fields = fields[1:]
+        if len(fields) < 4:
+            return None
+        data_len = int(fields[3])
+        data = fields[4:4 + data_len]
+    else:
+        if len(tokens) < 6 or tokens[4] != "d":
+            return None
+        raw_id = tokens[2]
+        data = tokens[6:6 + int(tokens[5], 16)]
+
+    is_extended = raw_id[-1] in "xX"
+    msg_id = int(raw_id.rstrip("xX"), base)
+    return timestamp, msg_id, is_extended, data
+
+
+def _parse_candump_line(tokens):
+    """
+    candump -l lines: (<time>) <interface> <id>#<data> or <id>##<flags><data> for CAN FD,
+    and candump -t output: (<time>) <interface> <id> [<dlc>] <data bytes...>. Returns (time, id, is extended,
+    data) or None for remote frames, which carry no data.
+    """
+    if len(tokens) < 3 or not tokens[0].startswith("("):
+        return None
+    timestamp = float(tokens[0].strip("()"))
+
+    frame = tokens[2]
+    if "#" in frame:
+        raw_id, _, data = frame.partition("#")
+        if data.startswith("#"):
+            data = data[2:]
+        elif data.startswith("R"):
+            return None
+        return timestamp, int(raw_id, 16), len(raw_id) > CANDUMP_STANDARD_ID_LEN, data
+    if len(tokens) < 4 or "remote" in tokens[4:]:
+        return None
+    return timestamp, int(frame, 16), len(frame) > CANDUMP_STANDARD_ID_LEN, "".join(tokens[4:])
+
+
+def _is_candump(trace_path: pathlib.Path, first_line: bytes):
+    if trace_path.suffix.lower() in CANDUMP_SUFFIXES:
+        return True
+    return first_line.lstrip().startswith(b"(")
+
+
+def _build_chunk(timestamps, msg_ids, payloads, is_extended):
+    width = max(CLASSIC_PAYLOAD_LEN, max(len(payload) for payload in payloads))
+    buffer = b"".join(payload.ljust(width, b"\x00") for payload in payloads)
+    return FrameChunk(timestamps=np.array(timestamps, dtype=np.float64),
+                      msg_ids=np.array(msg_ids, dtype=np.uint32),
+                      payloads=np.frombuffer(buffer, dtype=np.uint8).reshape(len(payloads), width),
+                      is_extended=np.array(is_extended, dtype=bool))
+
+
+def iter_frame_chunks(trace_path, chunk_size: int = 100000, msg_ids=None, start_time: float = None,
+                      end_time: float = None, stats: TraceStats = None):
+    """
+    Reads a Vector ASC or candump trace through a memory map and yields FrameChunk objects of at most
+    chunk_size frames, so memory use doesn't depend on the size of the trace. The ID and time window
+    filters are checked before the data bytes of a frame are parsed. An ID with the DBC extended flag only
+    matches extended frames, one without it frames of both types.
+    """
+    trace_path = pathlib.Path(trace_path)
+    if stats is None:
+        stats = TraceStats()
+    if msg_ids is not None:
+        msg_ids = {(msg_id & EXTENDED_ID_MASK, is_extended) for msg_id in msg_ids
+                   for is_extended in ((True,) if msg_id & EXTENDED_ID_FLAG else (False, True))}
+
+    timestamps, frame_ids, payloads, frame_types = [], [], [], []
+    with open(trace_path, "rb") as f:
+        if trace_path.stat().st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            candump = _is_candump(trace_path, mm[:mm.find(b"\n")])
+            base = 16
+
+            for line in iter(mm.readline, b""):
+                stats.lines_read += 1
+                tokens = line.decode("latin-1").split()
+                if not tokens:
+                    continue
+                if not candump and tokens[0] == "base":
+                    base = 16 if tokens[1] == "hex" else 10
+                    continue
+
+                try:
+                    frame = _parse_candump_line(tokens) if candump else _parse_asc_line(tokens, base)
+                except ValueError:
+                    frame = None
+                if frame is None:
+                    continue
+
+                stats.frames_read += 1
+                timestamp, msg_id, is_extended, data = frame
+                if start_time is not None and timestamp < start_time:
+                    continue
+                if end_time is not None and timestamp > end_time:
+                    continue
+                if msg_ids is not None and (msg_id & EXTENDED_ID_MASK, is_extended) not in msg_ids:
+                    continue
+
+                if candump:
+                    payload = bytes.fromhex(data)
+                elif base == 16:
+                    payload = bytes.fromhex("".join(data))
+                else:
+                    payload = bytes(int(value) for value in data)
+
+                timestamps.append(timestamp)
+                frame_ids.append(msg_id)
+                payloads.append(payload)
+                frame_types.append(is_extended)
+                if len(frame_ids) >= chunk_size:
+                    stats.frames_kept += len(frame_ids)
+                    stats.bytes_read = mm.tell()
+                    yield _build_chunk(timestamps, frame_ids, payloads, frame_types)
+                    timestamps, frame_ids, payloads, frame_types = [], [], [], []
+            stats.bytes_read = mm.tell()
+
+    if frame_ids:
+        stats.frames_kept += len(frame_ids)
+        yield _build_chunk(timestamps, frame_ids, payloads, frame_types)
+
+
+def decode_trace(trace_path, batch_decoder: CAN_BatchDecoder, chunk_size: int = 100000, msg_ids=None,
+                 start_time: float = None, end_time: float = None, decode_choices: bool = False,
+                 stats: TraceStats = None):
+    """Yields {message name: {column name: array}} for every chunk of the trace, decoded as it streams."""
+    if stats is None:
+        stats = TraceStats()
+    start = time.perf_counter()
+    for chunk in iter_frame_chunks(trace_path, chunk_size, msg_ids, start_time, end_time, stats):
+        yield batch_decoder.decode(chunk.msg_ids, chunk.payloads, chunk.timestamps, decode_choices,
+                                   chunk.is_extended)
+        stats.elapsed = time.perf_counter() - start
+    stats.elapsed = time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="trace_reader",
+        description="Decodes Vector ASC and candump traces with the signals of the given DBCs"
+    )
+    parser.add_argument("trace", type=str)
+    parser.add_argument("-d", "--dbc", type=str, nargs="+", required=True)
+    parser.add_argument("--ids", type=lambda value: int(value, 0), nargs="+", default=None,
+                        help="Only decode frames with these IDs (e.g. 0x123 291)")
+    parser.add_argument("--start", type=float, default=None, help="Skip frames before this timestamp")
+    parser.add_argument("--end", type=float, default=None, help="Skip frames after this timestamp")
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("-o", "--output-dir", type=str, default=None,
+                        help="Appends the decoded signals to one CSV file per message in this directory")
+    args = parser.parse_args()
+
+    messages = [can_message for dbc_path in args.dbc for can_message in load_dbc(dbc_path).messages]
+    trace_decoder = CAN_BatchDecoder(messages)
+    output_dir = pathlib.Path(args.output_dir) if args.output_dir else None
+    if output_dir:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    run_stats = TraceStats()
+    frame_counts = {}
+    written = set()
+    for decoded in decode_trace(args.trace, trace_decoder, args.chunk_size, args.ids, args.start, args.end,
+                                stats=run_stats):
+        for msg_name, columns in decoded.items():
+            frame_counts[msg_name] = frame_counts.get(msg_name, 0) + len(next(iter(columns.values())))
+            if output_dir:
+                csv_path = output_dir / f"{msg_name}.csv"
+                pd.DataFrame(columns).to_csv(csv_path, mode="a" if msg_name in written else "w",
+                                             header=msg_name not in written, index=False)
+                written.add(msg_name)
+
+    for msg_name, frame_count in sorted(frame_counts.items()):
+        print(msg_name.ljust(30), frame_count)
+    print(run_stats)
@@ -1,8 +1,11 @@
 from dataclasses import dataclass
 from openpyxl import Workbook
-from openpyxl.styles import Font, Border, Side, PatternFill, Alignment
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Border, Side, PatternFill, Alignment, NamedStyle
+from openpyxl.utils import get_column_letter
 
 from excel_handling import auto_adjust_column_width
+from instrumentation import logger
 
 
 @dataclass
@@ -12,12 +15,21 @@ class CAN_dbc:
 
 
 @dataclass
+class DBC_Content:
+    messages: list
+    nodes: list
+    comment: str = None
+
+
+@dataclass(slots=True)
 class CAN_Message:
     msg_name: str
     msg_id: int
     msg_len: int
     sender: str
     signals: list
+    transmitters: list = None
+    comment: str = None
 
     def __str__(self):
         return f"CAN Message: {self.msg_name} ID: {self.msg_id} MSG length: {self.msg_len}"
@@ -30,7 +42,7 @@ class CAN_Message:
         return ["Message name", "Message ID", "Message length", "Sender"]
 
 
-@dataclass
+@dataclass(slots=True)
 class CAN_Signal:
     signal_name: str
     bit_start: int
@@ -44,6 +56,7 @@ class CAN_Signal:
     unit: str
     receivers: list
     enums: dict = None
+    comment: str = None
 
     def __str__(self):
         return (f"{self.signal_name} start_bit: {self.bit_start} bit length: {self.bit_len} "
@@ -130,7 +143,7 @@ def write_data_to_xlsx(xlsx_path, data):
                 if signal.enums:
                     raw_data.append([f"{message.msg_name}::{signal.signal_name}"])
                     for val, enum in signal.enums:
-                        print(val, enum)
+                        logger.debug("%s %s", val, enum)
                         raw_data.append(["", int(val.replace('"', '').strip()), enum])
         for row_index, row_data in enumerate(raw_data, start=2):
             for col_index, value in enumerate(row_data, start=1):
@@ -138,3 +151,89 @@ def write_data_to_xlsx(xlsx_path, data):
                 cell.border = border
         auto_adjust_column_width(worksheet)
     workbook.save(xlsx_path)
+
+
+def _message_rows(messages):
+    for message in messages:
+        yield message.to_row()
+
+
+def _signal_rows(messages):
+    separator = ["-"] * (len(CAN_Signal.get_headers()) + 1)
+    for message in messages:
+        for signal in message.signals:
+            yield [message.msg_name] + signal.to_row()
+        yield separator
+
+
+def _enum_rows(messages):
+    for message in messages:
+        for signal in message.signals:
+            if signal.enums:
+                yield [f"{message.msg_name}::{signal.signal_name}"]
+                for val, enum in signal.enums:
+                    yield ["", int(val.replace('"', '').strip()), enum]
+
+
+def _column_widths(headers, rows):
+    """Same widths as auto_adjust_column_width, computed from the values instead of the written cells."""
+    widths = [len(str(header)) + 0.71 if header else 0 for header in headers]
+    for row in rows:
+        for col_index, value in enumerate(row):
+            if value:
+                width = len(str(value)) + 0.71
+                if col_index >= len(widths):
+                    widths.extend([0] * (col_index + 1 - len(widths)))
+                if width > widths[col_index]:
+                    widths[col_index] = width
+    return widths
+
+
+def _write_only_sheet(workbook, title, headers, rows_factory):
+    worksheet = workbook.create_sheet(title=title)
+    # Write-only sheets emit their column definitions before the first row, so the widths are
+    # taken from a lightweight pass over the row values before any cell is created
+    for col_index, width in enumerate(_column_widths(headers, rows_factory()), start=1):
+        worksheet.column_dimensions[get_column_letter(col_index)].width = width
+
+    header_cells = []
+    for header_data in headers:
+        cell = WriteOnlyCell(worksheet, value=header_data)
+        cell.style = "DBC header"
+        header_cells.append(cell)
+    worksheet.append(header_cells)
+
+    for row_data in rows_factory():
+        row_cells = []
+        for value in row_data:
+            cell = WriteOnlyCell(worksheet, value=value)
+            cell.style = "DBC cell"
+            row_cells.append(cell)
+        worksheet.append(row_cells)
+
+
+def write_data_to_xlsx_streaming(xlsx_path, data):
+    """
+    Writes the same messages/signals/enums sheets as write_data_to_xlsx through a write-only workbook.
+    Rows are streamed to disk with shared named styles, so memory stays flat regardless of the DBC size.
+    """
+    workbook = Workbook(write_only=True)
+
+    side = Side(border_style="thin", color="000000")
+    border = Border(left=side, right=side, top=side, bottom=side)
+    workbook.add_named_style(NamedStyle(name="DBC header", font=Font(bold=True, color="FFFFFF"),
+                                        fill=PatternFill(start_color="4F81BD", end_color="4F81BD",
+                                                         fill_type="solid"),
+                                        border=border,
+                                        alignment=Alignment(horizontal="center", vertical="center")))
+    workbook.add_named_style(NamedStyle(name="DBC cell", border=border))
+
+    for can_dbc in data:
+        messages = data[can_dbc]
+        _write_only_sheet(workbook, f"{can_dbc} messages", CAN_Message.get_headers(),
+                          lambda: _message_rows(messages))
+        _write_only_sheet(workbook, f"{can_dbc} signals", ["Message name"] + CAN_Signal.get_headers(),
+                          lambda: _signal_rows(messages))
+        _write_only_sheet(workbook, f"{can_dbc} enums", ["Message name", "Enum", "Value"],
+                          lambda: _enum_rows(messages))
+    workbook.save(xlsx_path)
@@ -0,0 +1,108 @@
+import hashlib
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+
+@dataclass(slots=True)
+class Card:
+    original: str
+    sentence: str
+    translation: str
+
+
+def iter_cards(xml_path) -> Iterator[Card]:
+    """
+    Yields the cards of one deck while it is being read: every card is removed from the tree once parsed,
+    so only the current card is held in memory.
+    """
+    parents = []
+    for event, element in ET.iterparse(xml_path, events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            continue
+        parents.pop()
+        if element.tag != "card":
+            continue
+        fields = {field.get("name"): field.text or '' for field in element.iter("rich-text")}
+        yield Card(fields.get("original", ''), fields.get("sentence", ''), fields.get("translation", ''))
+        if parents:
+            parents[-1].remove(element)
+
+
+def parse_deck(xml_path) -> Optional[List[Card]]:
+    """Returns the cards of one deck, or None if the deck can't be read (the error is printed)."""
+    print(f"Processing {xml_path}...")
+    try:
+        return list(iter_cards(xml_path))
+    except ET.ParseError as e:
+        print(f"Error parsing {xml_path}: {e}")
+    except FileNotFoundError as e:
+        print(f"File {xml_path} not found: {e}")
+    return None
+
+
+def parse_decks(xml_paths: Iterable, workers: int = 1) -> Iterator[Optional[List[Card]]]:
+    """
+    Yields the cards of every deck (None for decks that can't be read), in the order of xml_paths. With several
+    workers the decks are parsed on a process pool, at most 2 * workers decks ahead of the consumer.
+    """
+    if workers <= 1:
+        yield from map(parse_deck, xml_paths)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        window = []
+        for xml_path in xml_paths:
+            window.append(executor.submit(parse_deck, xml_path))
+            if len(window) >= 2 * workers:
+                yield window.pop(0).result()
+        for future in window:
+            yield future.result()
+
+
+def card_key(card: Card) -> bytes:
+    """Deduplication key: digest of the Italian sentence, or of the original for cards without a sentence."""
+    text = card.sentence if card.sentence else f"\0{card.original}"
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+def csv_row(card: Card, sentence_pl: str) -> List[str]:
+    """Output CSV row: the original, then the translation, the Italian sentence and its translation on separate lines."""
+    return [card.original, f"{card.translation}\n{card.sentence}\n{sentence_pl}"]
+
+
+def parse_csv_row(row: List[str]) -> Tuple[Card, str]:
+    """
+    Reverse of csv_row: returns the card and the sentence translation of an output CSV row. Only exact when
+    neither the sentence nor its translation spans several lines.
+    """
+    merged, _, sentence_pl = row[1].rpartition("\n") if len(row) > 1 else ('', '', '')
+    translation, _, sentence = merged.rpartition("\n")
+    return Card(row[0] if row else '', sentence, translation), sentence_pl
+
+
+def row_sentence_translation(row: List[str], sentence: str) -> str:
+    """Sentence translation of an output CSV row written by csv_row for a card with the given sentence."""
+    if len(row) < 2:
+        return ''
+    marker = f"\n{sentence}\n"
+    index = row[1].rfind(marker)
+    return row[1][index + len(marker):] if index >= 0 else ''
+
+
+class Deduplicator:
+    """Drops the cards whose key was already seen; only the 16 byte key digests are kept."""
+
+    def __init__(self):
+        self.seen = set()
+        self.duplicates = 0
+
+    def __call__(self, cards: Iterable[Card]) -> Iterator[Card]:
+        for card in cards:
+            key = card_key(card)
+            if key in self.seen:
+                self.duplicates += 1
+                continue
+            self.seen.add(key)
+            yield card
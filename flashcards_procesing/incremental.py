@@ -0,0 +1,245 @@
+import csv
+import hashlib
+import json
+import os
+import pathlib
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Set
+
+from deck_parser import Card, card_key, csv_row, parse_csv_row, parse_decks, row_sentence_translation
+from translation import StubTranslator, translate_stream
+from translation_memory import TranslationMemory
+
+MANIFEST = 'flashcards_manifest.json'
+MANIFEST_VERSION = 2
+_CHUNK = 1024 * 1024
+
+
+@dataclass(slots=True)
+class DeckState:
+    sha256: str
+    size: int
+    mtime_ns: int
+    # Keys (card_key hex digests) of the cards of the deck, duplicates included
+    cards: List[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class MergeStats:
+    decks_changed: int = 0
+    decks_removed: int = 0
+    kept: int = 0
+    replaced: int = 0
+    added: int = 0
+    dropped: int = 0
+    translated: int = 0
+
+
+@dataclass(slots=True)
+class Manifest:
+    decks: Dict[str, DeckState] = field(default_factory=dict)
+    # Key of every output CSV row, in order; None for rows of no known card, which are always kept
+    rows: List[Optional[str]] = None
+    # Keys of the rows whose sentence translation is a placeholder of the stub translator
+    stub_keys: List[str] = field(default_factory=list)
+
+
+def load_manifest(manifest_path) -> Manifest:
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return Manifest()
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        print(f"Ignoring corrupt manifest '{manifest_path}': {e}")
+        return Manifest()
+    if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+        return Manifest()
+    return Manifest({name: DeckState(**state) for name, state in data["decks"].items()}, data.get("rows"),
+                    data.get("stub_keys", []))
+
+
+def save_manifest(manifest_path, manifest: Manifest):
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, mode='w', encoding='utf-8') as f:
+        json.dump({"version": MANIFEST_VERSION,
+                   "decks": {name: asdict(state) for name, state in manifest.decks.items()},
+                   "rows": manifest.rows,
+                   "stub_keys": manifest.stub_keys}, f)
+    os.replace(temp_path, manifest_path)
+
+
+def deck_state(xml_path, previous: DeckState = None) -> DeckState:
+    """
+    Current state of a deck file, with the cards of the previous state if the content is the same. The content
+    is hashed only if the size or mtime changed.
+    """
+    stat = os.stat(xml_path)
+    if previous is not None and previous.size == stat.st_size and previous.mtime_ns == stat.st_mtime_ns:
+        return DeckState(previous.sha256, stat.st_size, stat.st_mtime_ns, previous.cards)
+    digest = hashlib.sha256()
+    with open(xml_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+    cards = previous.cards if previous is not None and previous.sha256 == sha256 else []
+    return DeckState(sha256, stat.st_size, stat.st_mtime_ns, cards)
+
+
+def _read_rows(output_csv):
+    try:
+        with open(output_csv, mode='r', newline='', encoding='utf-8') as input_csv:
+            yield from csv.reader(input_csv, delimiter=';')
+    except FileNotFoundError:
+        return
+
+
+def _row_keys(rows: List[List[str]], manifest: Manifest, known_keys, updates: Dict[str, Card]) -> List[Optional[str]]:
+    """
+    Returns the key of every output row: from the manifest when it lists exactly the rows of the output, else
+    recomputed from the row. Rows that can't be split back into their card (multi-line sentences) are matched
+    against the written form of the updated cards; keys of no known card are None.
+    """
+    if manifest.rows is not None and len(manifest.rows) == len(rows):
+        return manifest.rows
+    prefixes = {}
+    for key, card in updates.items():
+        original, merged = csv_row(card, '')
+        prefixes.setdefault(original, []).append((merged, key))
+    row_keys = []
+    for row in rows:
+        key = card_key(parse_csv_row(row)[0]).hex()
+        if key not in known_keys:
+            key = next((key for merged, key in prefixes.get(row[0] if row else '', ())
+                        if len(row) > 1 and row[1].startswith(merged)), None)
+        row_keys.append(key)
+    return row_keys
+
+
+def update_decks(xml_paths, output_csv, manifest_path=MANIFEST, workers: int = 1, memory: TranslationMemory = None,
+                 stub: bool = False, **translate_options) -> MergeStats:
+    """
+    Incremental run: only the decks that are new or whose content changed since the manifest was written are
+    parsed, and their cards are merged into output_csv. Rows are kept in place while any unchanged deck still
+    has their card, replaced in place when a changed deck modified the card, dropped when no deck has it
+    anymore, and new cards are appended. Rows whose card is unknown are kept. Translations already in the
+    output are reused for unchanged sentences, except stub placeholders outside of stub runs: the decks of
+    such rows are parsed again and their sentences translated. Without a manifest every deck counts as new,
+    which gives a full run that reuses the existing output. The output is read once, and only appended to when
+    no existing row changes (e.g. when decks were only added).
+    """
+    stats = MergeStats()
+    previous = load_manifest(manifest_path)
+    xml_paths = [pathlib.Path(xml_path) for xml_path in xml_paths]
+    decks = {xml_path.name: deck_state(xml_path, previous.decks.get(xml_path.name)) for xml_path in xml_paths}
+    previous_stub = set(previous.stub_keys)
+    changed = [xml_path for xml_path in xml_paths if xml_path.name not in previous.decks
+               or previous.decks[xml_path.name].sha256 != decks[xml_path.name].sha256
+               or not stub and not previous_stub.isdisjoint(previous.decks[xml_path.name].cards)]
+    stats.decks_changed = len(changed)
+    stats.decks_removed = sum(1 for name in previous.decks if name not in decks)
+
+    parsed = []
+    for xml_path, cards in zip(changed, parse_decks(changed, workers)):
+        if cards is None:
+            # Left as it was: the manifest entry (and so the rows) of the last successful parse are kept, and
+            # the deck is parsed again on the next run
+            if xml_path.name in previous.decks:
+                decks[xml_path.name] = previous.decks[xml_path.name]
+            else:
+                del decks[xml_path.name]
+        else:
+            parsed.append((xml_path, cards))
+    parsed_names = {xml_path.name for xml_path, _ in parsed}
+    kept_keys = {key for name, state in decks.items() if name not in parsed_names for key in state.cards}
+    # Cards of the parsed decks that no other deck provides, in deck order
+    updates: Dict[str, Card] = {}
+    for xml_path, cards in parsed:
+        state = decks[xml_path.name]
+        state.cards = []
+        for card in cards:
+            key = card_key(card).hex()
+            state.cards.append(key)
+            if key not in kept_keys and key not in updates:
+                updates[key] = card
+    known_keys = kept_keys | updates.keys() | {key for state in previous.decks.values() for key in state.cards}
+
+    output_rows = list(_read_rows(output_csv))
+    row_keys = _row_keys(output_rows, previous, known_keys, updates)
+    # Translations of the output that are still valid for the updated cards: same key, so same sentence
+    translations = {}
+    for row, key in zip(output_rows, row_keys):
+        if key in updates and key not in translations and (stub or key not in previous_stub):
+            sentence_pl = row_sentence_translation(row, updates[key].sentence)
+            if sentence_pl:
+                translations[key] = sentence_pl
+    missing = [(key, card) for key, card in updates.items() if key not in translations]
+    # Rows kept as they are stay placeholders, and so do the reused translations of a stub run
+    stub_keys = {key for key in previous_stub if key not in updates or key in translations}
+    for (key, card), sentence_pl in translate_stream(missing, lambda item: item[1].sentence,
+                                                     backend=StubTranslator() if stub else None, src='it',
+                                                     dest='pl', memory=memory, **translate_options):
+        translations[key] = sentence_pl
+        if sentence_pl:
+            stats.translated += 1
+            if stub:
+                stub_keys.add(key)
+            print(f"#{stats.translated} Translated '{card.sentence}' to '{sentence_pl}'")
+
+    known_rows = [key for key in row_keys if key is not None]
+    if all(key in kept_keys for key in known_rows) and len(set(known_rows)) == len(known_rows):
+        # Every row stays as it is (e.g. decks were only added): the new cards are appended instead of
+        # rewriting the output
+        rows = list(row_keys)
+        stats.kept = len(rows)
+        if updates:
+            with open(output_csv, mode='a', newline='', encoding='utf-8') as output_file:
+                writer = csv.writer(output_file, quoting=csv.QUOTE_MINIMAL, delimiter=';')
+                for key, card in updates.items():
+                    writer.writerow(csv_row(card, translations[key]))
+                    rows.append(key)
+                    stats.added += 1
+    else:
+        temp_path = f"{output_csv}.tmp"
+        rows = []
+        written = set()
+        with open(temp_path, mode='w', newline='', encoding='utf-8') as output_file:
+            writer = csv.writer(output_file, quoting=csv.QUOTE_MINIMAL, delimiter=';')
+            for row, key in zip(output_rows, row_keys):
+                if key in written:
+                    continue
+                if key in updates and csv_row(updates[key], translations[key]) != row:
+                    writer.writerow(csv_row(updates[key], translations[key]))
+                    stats.replaced += 1
+                elif key is None or key in updates or key in kept_keys:
+                    writer.writerow(row)
+                    stats.kept += 1
+                else:
+                    stats.dropped += 1
+                    continue
+                rows.append(key)
+                if key is not None:
+                    written.add(key)
+            for key, card in updates.items():
+                if key not in written:
+                    writer.writerow(csv_row(card, translations[key]))
+                    rows.append(key)
+                    stats.added += 1
+        os.replace(temp_path, output_csv)
+    save_manifest(manifest_path, Manifest(decks, rows, [key for key in rows if key in stub_keys]))
+    return stats
+
+
+def stub_rows(output_csv, manifest_path=MANIFEST) -> Set[int]:
+    """Indexes of the output rows whose sentence translation came from the stub translator, as per the manifest."""
+    manifest = load_manifest(manifest_path)
+    if manifest.rows is None or len(manifest.rows) != sum(1 for _ in _read_rows(output_csv)):
+        return set()
+    stub_keys = set(manifest.stub_keys)
+    return {index for index, key in enumerate(manifest.rows) if key in stub_keys}
+
+
+def print_merge_stats(stats: MergeStats, output_csv):
+    print(f"{stats.decks_changed} new or changed decks, {stats.decks_removed} removed decks.")
+    print(f"CSV file '{output_csv}' updated: {stats.kept} cards kept, {stats.replaced} replaced, {stats.added} added, "
+          f"{stats.dropped} dropped, {stats.translated} sentences translated.")
@@ -1,97 +1,103 @@
+import argparse
 import os
 import pathlib
-import xml.etree.ElementTree as ET
-import pandas as pd
 import csv
 
-from googletrans import Translator
+from deck_parser import Deduplicator, csv_row, parse_decks
+from incremental import MANIFEST, print_merge_stats, stub_rows, update_decks
+from translation import (DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_SIZE, DEFAULT_CONCURRENCY, DEFAULT_RATE, StubTranslator,
+                         translate_stream)
+from translation_memory import TranslationMemory
 
 # Input and output CSV file paths
 INPUT_DIR = './flashcards_input'
-PREPROCESSED_CSV = 'preprocessed_cards.csv'
-CLEANED_CSV = 'cleaned_cards.csv'
 OUTPUT_CSV = 'output.csv'
-
-# Open CSV file for writing (without translation)
-with open(PREPROCESSED_CSV, mode='w', newline='', encoding='utf-8') as file:
-    writer = csv.writer(file)
-
-    # Write CSV header
-    writer.writerow(['Original', 'Translation', 'Sentence (Italian)'])
-
-    # Process each XML file
-    for xml_file in pathlib.Path(os.getcwd(), INPUT_DIR).iterdir():
-        if xml_file.suffix != '.xml':
-            continue
-
-        print(f"Processing {xml_file}...")
-        file_path = os.path.join(INPUT_DIR, xml_file)
-
-        # Parse XML data
-        try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-
-            # Loop through each card in the XML
-            for card in root.findall(".//card"):
-                original = card.find(".//rich-text[@name='original']").text or ''
-                sentence_it = card.find(".//rich-text[@name='sentence']").text or ''
-                translation = card.find(".//rich-text[@name='translation']").text or ''
-
-                # Write row to CSV
-                writer.writerow([original, sentence_it, translation])
-
-        except ET.ParseError as e:
-            print(f"Error parsing {xml_file}: {e}")
-        except FileNotFoundError as e:
-            print(f"File {xml_file} not found: {e}")
-
-print(f"CSV file '{PREPROCESSED_CSV}' created successfully.")
-
-# PANDAS part
-# Read the original CSV into a DataFrame and count duplicates based on the 'Sentence (Italian)' column
-df = pd.read_csv(PREPROCESSED_CSV)
-duplicate_count = df.duplicated(subset=['Sentence (Italian)'], keep=False).sum()
-print(f"Found {duplicate_count} duplicates.")
-
-# Remove duplicates and save the cleaned data
-df_unique = df.drop_duplicates(subset=['Sentence (Italian)'])
-df_unique.to_csv(CLEANED_CSV, index=False)
-print(f"Duplicates removed and data saved to 'cleaned_cards.csv'.")
-
-# Initialize Google Translate (unofficial)
-translator = Translator()
-
-count = 0
-# Open the cleaned CSV for reading and the translated CSV for writing
-with open(CLEANED_CSV, mode='r', newline='', encoding='utf-8') as input_csv:
-    with open(OUTPUT_CSV, mode='w', newline='', encoding='utf-8') as output_csv:
-        reader = csv.reader(input_csv)
-        writer = csv.writer(output_csv, quoting=csv.QUOTE_MINIMAL, delimiter=';')
-
-        # Read header from the original file but do not write it to the new file (drop it)
-        header = next(reader)
-
-        # Translate each sentence and write it to the new CSV
-        for row in reader:
-            original, sentence_it, translation = row
-
-            # Skip empty sentences
-            if sentence_it:
-                try:
-                    # Translate the sentence
-                    sentence_pl = translator.translate(sentence_it, src='it', dest='pl').text
-                    count += 1
-                    print(f"#{count} Translated '{sentence_it}' to '{sentence_pl}'")
-                except Exception as e:
-                    print(f"Error translating sentence '{sentence_it}': {e}")
-                    sentence_pl = ''
-            else:
-                sentence_pl = ''
-
-            # Merge the original and translated sentences into one column
-            first_column = original
-            # Merge the column and add newlines between the fields
-            merged_column = f"{translation}\n{sentence_it}\n{sentence_pl}"
-            writer.writerow([first_column, merged_column])
-print(f"CSV file '{OUTPUT_CSV}' created successfully with translated sentences.")
+# Runs with the stub translator write here, so that its placeholders never replace real translations
+STUB_OUTPUT_CSV = 'output_stub.csv'
+STUB_MANIFEST = 'flashcards_manifest_stub.json'
+TRANSLATION_MEMORY = 'translation_memory.sqlite'
+
+
+def deck_paths(input_dir=INPUT_DIR):
+    return sorted(xml_file for xml_file in pathlib.Path(os.getcwd(), input_dir).iterdir() if xml_file.suffix == '.xml')
+
+
+def process_decks(xml_paths, output_csv=OUTPUT_CSV, workers: int = 1, memory: TranslationMemory = None,
+                  stub: bool = False, **translate_options):
+    """
+    Single pass over the decks: the cards are parsed (on `workers` processes), deduplicated on the Italian
+    sentence, translated in chunks and written to output_csv as they come, without intermediate files.
+    """
+    deduplicate = Deduplicator()
+    cards = (card for deck in parse_decks(xml_paths, workers) for card in deck or ())
+    translated = translate_stream(deduplicate(cards), lambda card: card.sentence,
+                                  backend=StubTranslator() if stub else None, src='it', dest='pl', memory=memory,
+                                  **translate_options)
+
+    count = 0
+    with open(output_csv, mode='w', newline='', encoding='utf-8') as output_file:
+        writer = csv.writer(output_file, quoting=csv.QUOTE_MINIMAL, delimiter=';')
+        for card, sentence_pl in translated:
+            if sentence_pl:
+                count += 1
+                print(f"#{count} Translated '{card.sentence}' to '{sentence_pl}'")
+
+            writer.writerow(csv_row(card, sentence_pl))
+    print(f"Removed {deduplicate.duplicates} duplicates.")
+    print(f"CSV file '{output_csv}' created successfully with translated sentences.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="process_xml_flashcards_to_csv",
+        description="Converts flashcard XML decks into a CSV with Polish translations of the Italian sentences"
+    )
+    parser.add_argument("--stub", action="store_true",
+                        help=f"Use the offline stub translator instead of Google Translate, writing to "
+                             f"'{STUB_OUTPUT_CSV}' instead of '{OUTPUT_CSV}'")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Sentences per translation batch")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Translation batches in flight")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Sentences (translation requests) per second")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Cards held in memory and translated at a time")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes parsing the decks")
+    parser.add_argument("--memory", type=str, default=TRANSLATION_MEMORY, help="Translation memory database")
+    parser.add_argument("--no-memory", action="store_true", help="Translate every sentence again")
+    parser.add_argument("--memory-max-entries", type=int, default=None,
+                        help="Evict the least recently used translations above this many entries")
+    parser.add_argument("--seed-memory", type=str, nargs="?", const=OUTPUT_CSV, default=None,
+                        help="Import the translations of an existing output CSV (defaults to the current output) "
+                             "into the memory before translating")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Parse only the new or changed decks and merge their cards into the existing output")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help=f"Deck hashes and card keys of the last incremental run (default '{MANIFEST}', "
+                             f"or '{STUB_MANIFEST}' with --stub)")
+    args = parser.parse_args()
+
+    # The stub translations are never cached and go to their own output and manifest, so they can't end up in the
+    # real output
+    output_csv = STUB_OUTPUT_CSV if args.stub else OUTPUT_CSV
+    manifest = args.manifest or (STUB_MANIFEST if args.stub else MANIFEST)
+    memory = None if args.no_memory or args.stub else TranslationMemory(args.memory, args.memory_max_entries)
+    if memory is not None and args.seed_memory == STUB_OUTPUT_CSV:
+        print(f"Not importing the stub translations of '{args.seed_memory}'.")
+    elif memory is not None and args.seed_memory:
+        # Stub placeholders merged into the output by an incremental run are left out
+        skip_rows = stub_rows(args.seed_memory, manifest) if args.seed_memory == output_csv else set()
+        imported = memory.seed_from_output_csv(args.seed_memory, skip_rows=skip_rows)
+        print(f"Imported {imported} translations from '{args.seed_memory}'.")
+
+    translate_options = dict(batch_size=args.batch_size, concurrency=args.concurrency, rate=args.rate,
+                             chunk_size=args.chunk_size)
+    if args.incremental:
+        stats = update_decks(deck_paths(), output_csv, manifest, workers=args.workers, memory=memory,
+                             stub=args.stub, **translate_options)
+        print_merge_stats(stats, output_csv)
+    else:
+        process_decks(deck_paths(), output_csv, workers=args.workers, memory=memory, stub=args.stub,
+                      **translate_options)
+    if memory is not None:
+        memory.print_stats()
+        memory.close()
@@ -0,0 +1,193 @@
+import abc
+import asyncio
+import itertools
+import random
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from translation_memory import TranslationMemory
+
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE = 5.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+# Items translated at a time by translate_stream
+DEFAULT_CHUNK_SIZE = 500
+
+T = TypeVar("T")
+
+
+class TranslationBackend(abc.ABC):
+    """Translates batches of sentences; implementations only need translate_batch."""
+
+    @abc.abstractmethod
+    async def translate_batch(self, texts: List[str], src: str, dest: str) -> List[str]:
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class StubTranslator(TranslationBackend):
+    """
+    Offline backend for tests and benchmarks: returns "[dest] text" after the given latency per batch,
+    and fails a batch with the given probability to exercise the retries.
+    """
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+
+    async def translate_batch(self, texts: List[str], src: str, dest: str) -> List[str]:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.random.random() < self.failure_rate:
+            raise ConnectionError("Stub translator failure")
+        return [f"[{dest}] {text}" for text in texts]
+
+
+class GoogleTranslateBackend(TranslationBackend):
+    """
+    googletrans backend. Its Translator is synchronous and keeps a pooled HTTP connection, so a pool of
+    `size` Translators is created once and every batch runs on one of them in a worker thread. A batch
+    is still one HTTP request per sentence, sent one after another.
+    """
+
+    def __init__(self, size: int = DEFAULT_CONCURRENCY):
+        from googletrans import Translator
+
+        self.translators = asyncio.Queue()
+        for _ in range(size):
+            self.translators.put_nowait(Translator())
+
+    async def translate_batch(self, texts: List[str], src: str, dest: str) -> List[str]:
+        translator = await self.translators.get()
+        try:
+            translated = await asyncio.to_thread(translator.translate, texts, src=src, dest=dest)
+            return [result.text for result in translated]
+        finally:
+            self.translators.put_nowait(translator)
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1.0):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+async def _translate_batch_with_retry(backend: TranslationBackend, texts: List[str], src: str, dest: str,
+                                      semaphore: asyncio.Semaphore, bucket: Optional[TokenBucket], retries: int,
+                                      backoff: float) -> List[str]:
+    for attempt in range(retries + 1):
+        async with semaphore:
+            if bucket is not None:
+                # Charged per sentence: backends like googletrans send one request per sentence of a batch
+                await bucket.acquire(len(texts))
+            try:
+                translated = await backend.translate_batch(texts, src, dest)
+                if len(translated) != len(texts):
+                    raise ValueError(f"Expected {len(texts)} translations, got {len(translated)}")
+                return translated
+            except Exception as e:
+                error = e
+        if attempt < retries:
+            # Exponential backoff with jitter, outside of the semaphore so other batches can proceed
+            await asyncio.sleep(backoff * 2 ** attempt * (0.5 + random.random()))
+    if len(texts) > 1:
+        # One bad sentence shouldn't cost the whole batch: translate the sentences one by one
+        print(f"Error translating a batch of {len(texts)} sentences, translating them one by one: {error}")
+        translated = await asyncio.gather(*(_translate_batch_with_retry(backend, [text], src, dest, semaphore,
+                                                                        bucket, retries, backoff)
+                                            for text in texts))
+        return [translation for translation, in translated]
+    print(f"Error translating '{texts[0]}': {error}")
+    return [""]
+
+
+async def translate_all(texts: List[str], backend: TranslationBackend, src: str = "it", dest: str = "pl",
+                        batch_size: int = DEFAULT_BATCH_SIZE, concurrency: int = DEFAULT_CONCURRENCY,
+                        rate: Optional[float] = DEFAULT_RATE, retries: int = DEFAULT_RETRIES,
+                        backoff: float = DEFAULT_BACKOFF, memory: Optional[TranslationMemory] = None) -> List[str]:
+    """
+    Translates the texts in batches of batch_size, at most `concurrency` batches in flight and `rate`
+    sentences per second (None for no limit). Failed batches are retried with exponential backoff, then
+    translated sentence by sentence; sentences that still fail end up as empty translations. The result is in the order of texts; empty texts are not sent.
+    Translations found in the memory are not requested, and new ones are written back to it; every
+    distinct text is sent once.
+    """
+    results = [""] * len(texts)
+    pending = {}
+    for index, text in enumerate(texts):
+        if text:
+            pending.setdefault(text, []).append(index)
+    if memory is not None:
+        for text, translation in memory.get_many(pending, src, dest).items():
+            for index in pending.pop(text):
+                results[index] = translation
+
+    unique_texts = list(pending)
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(rate, capacity=max(rate, batch_size)) if rate else None
+
+    async def run_batch(batch_texts):
+        translated = await _translate_batch_with_retry(backend, batch_texts, src, dest, semaphore, bucket, retries,
+                                                       backoff)
+        for text, translation in zip(batch_texts, translated):
+            for index in pending[text]:
+                results[index] = translation
+        if memory is not None:
+            memory.put_many(zip(batch_texts, translated), src, dest)
+
+    await asyncio.gather(*(run_batch(unique_texts[start:start + batch_size])
+                           for start in range(0, len(unique_texts), batch_size)))
+    return results
+
+
+def translate_sentences(texts: List[str], backend: Optional[TranslationBackend] = None, **options) -> List[str]:
+    """Synchronous entry point of translate_all; uses the googletrans backend by default."""
+
+    async def run():
+        used_backend = backend or GoogleTranslateBackend(options.get("concurrency", DEFAULT_CONCURRENCY))
+        try:
+            return await translate_all(texts, used_backend, **options)
+        finally:
+            await used_backend.aclose()
+
+    return asyncio.run(run())
+
+
+def translate_stream(items: Iterable[T], text: Callable[[T], str], backend: Optional[TranslationBackend] = None,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE, **options) -> Iterator[Tuple[T, str]]:
+    """
+    Yields (item, translation of text(item)) in the order of items, translating chunk_size items at a time
+    with translate_all, so that only one chunk is held in memory. One event loop and backend serve all chunks.
+    """
+    with asyncio.Runner() as runner:
+        used_backend = backend or GoogleTranslateBackend(options.get("concurrency", DEFAULT_CONCURRENCY))
+        try:
+            iterator = iter(items)
+            while chunk := list(itertools.islice(iterator, chunk_size)):
+                translations = runner.run(translate_all([text(item) for item in chunk], used_backend, **options))
+                yield from zip(chunk, translations)
+        finally:
+            runner.run(used_backend.aclose())
@@ -0,0 +1,120 @@
+import csv
+import sqlite3
+import time
+import unicodedata
+from typing import Collection, Dict, Iterable, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    src TEXT NOT NULL,
+    dest TEXT NOT NULL,
+    key TEXT NOT NULL,
+    translation TEXT NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (src, dest, key)
+);
+CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used);
+"""
+# SQLite limits the number of bound parameters of one statement
+_LOOKUP_CHUNK = 500
+
+
+def normalize(text: str) -> str:
+    """Cache key of a sentence: NFC normalized, with whitespace runs collapsed (case and punctuation are kept)."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TranslationMemory:
+    """
+    Translations already made, stored in SQLite keyed by (src, dest, normalized text). With max_entries
+    the least recently used entries are evicted once the cap is exceeded. Hits and misses of the
+    lookups are counted for the end of run statistics.
+    """
+
+    def __init__(self, db_path, max_entries: Optional[int] = None):
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def get_many(self, texts: Iterable[str], src: str, dest: str) -> Dict[str, str]:
+        """Returns the cached translations of the texts, keyed by text, and marks them as recently used."""
+        keys = {}
+        for text in texts:
+            keys.setdefault(normalize(text), []).append(text)
+        found = {}
+        key_list = list(keys)
+        for start in range(0, len(key_list), _LOOKUP_CHUNK):
+            chunk = key_list[start:start + _LOOKUP_CHUNK]
+            rows = self.connection.execute(
+                f"SELECT key, translation FROM translations WHERE src = ? AND dest = ? "
+                f"AND key IN ({', '.join('?' * len(chunk))})", (src, dest, *chunk))
+            found.update(rows)
+
+        if found:
+            now = time.time_ns()
+            with self.connection:
+                self.connection.executemany("UPDATE translations SET last_used = ? WHERE src = ? AND dest = ? "
+                                            "AND key = ?", ((now, src, dest, key) for key in found))
+        translations = {}
+        for key, key_texts in keys.items():
+            if key in found:
+                self.hits += len(key_texts)
+                for text in key_texts:
+                    translations[text] = found[key]
+            else:
+                self.misses += len(key_texts)
+        return translations
+
+    def put_many(self, pairs: Iterable[Tuple[str, str]], src: str, dest: str):
+        """Stores (text, translation) pairs; empty translations are not cached."""
+        now = time.time_ns()
+        rows = [(src, dest, normalize(text), translation, now) for text, translation in pairs if translation]
+        if not rows:
+            return
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)", rows)
+            self.stored += len(rows)
+            if self.max_entries is not None:
+                self.connection.execute(
+                    "DELETE FROM translations WHERE rowid IN (SELECT rowid FROM translations ORDER BY last_used "
+                    "LIMIT max(0, (SELECT COUNT(*) FROM translations) - ?))", (self.max_entries,))
+
+    def seed_from_output_csv(self, csv_path, src: str = "it", dest: str = "pl",
+                             skip_rows: Collection[int] = ()) -> int:
+        """
+        Imports the translations of an existing output CSV, whose second column holds the card translation,
+        the Italian sentence and its translation on separate lines, except the rows at the skip_rows indexes.
+        Returns the number of imported entries.
+        """
+        pairs = []
+        with open(csv_path, mode='r', newline='', encoding='utf-8') as input_csv:
+            for index, row in enumerate(csv.reader(input_csv, delimiter=';')):
+                if index in skip_rows:
+                    continue
+                lines = row[1].split("\n") if len(row) > 1 else []
+                if len(lines) >= 3 and lines[-2] and lines[-1]:
+                    pairs.append((lines[-2], lines[-1]))
+        self.put_many(pairs, src, dest)
+        return len(pairs)
+
+    def print_stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0.0
+        print(f"Translation memory: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), "
+              f"{self.stored} stored, {len(self)} entries")
@@ -0,0 +1,213 @@
+import abc
+import errno
+import hashlib
+import io
+import json
+import os
+import pathlib
+import shutil
+import sqlite3
+import tarfile
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no reflinks, the clone falls back to a regular copy
+    fcntl = None
+
+FICLONE = 0x40049409
+STORE_DIR = ".store"
+INDEX_NAME = "backup_index.sqlite"
+MANIFEST_NAME = "MANIFEST.json"
+_CHUNK = 1024 * 1024
+
+
+def file_hash(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reflink_file(src, dst) -> bool:
+    """Clones src to dst through a FICLONE reflink; returns False (dst left empty) where reflinks aren't supported."""
+    if fcntl is None:
+        return False
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def clone_file(src, dst):
+    """
+    Copies src to dst, sharing the data blocks through a FICLONE reflink where the filesystem supports
+    it (Btrfs, XFS), else copying inside the kernel with copy_file_range, else in user space.
+    """
+    if reflink_file(src, dst):
+        return
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            if not hasattr(os, "copy_file_range"):
+                raise OSError(errno.ENOSYS, "copy_file_range is not available")
+            while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 64 * _CHUNK):
+                pass
+        except OSError:
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+            shutil.copyfileobj(fsrc, fdst, _CHUNK)
+    shutil.copystat(src, dst)
+
+
+class BackupBackend(abc.ABC):
+    """
+    Stores the files displaced by one run of one repository under run_folder. backup() is called
+    with the absolute source path and the path relative to the repository root, before the source
+    is deleted; close() finishes the run.
+    """
+
+    def __init__(self, run_folder):
+        self.run_folder = pathlib.Path(run_folder)
+
+    @property
+    def location(self):
+        return self.run_folder
+
+    @abc.abstractmethod
+    def backup(self, source_path, rel_path: str):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CopyBackend(BackupBackend):
+    """Plain copy of every file into the run folder."""
+
+    def backup(self, source_path, rel_path: str):
+        target_path = self.run_folder / rel_path
+        os.makedirs(target_path.parent, exist_ok=True)
+        shutil.copy(source_path, target_path)
+
+
+class LinkBackend(BackupBackend):
+    """
+    Content-addressed store shared by all runs (STORE_DIR next to the run folders, one file per SHA-256).
+    New content is copied into the store (reflinked where the filesystem supports it, so no data is
+    duplicated), never linked to the source itself, whose later edits would change the backup; content
+    already in the store costs no new space. The run folder holds hardlinks to the store objects, or
+    reflinked copies of them with reflink=True; where the filesystem has no reflinks, the run falls back
+    to hardlinks (with a warning) instead of copying every file in full.
+    """
+
+    def __init__(self, run_folder, reflink: bool = False):
+        super().__init__(run_folder)
+        self.reflink = reflink
+        self.store = self.run_folder.parent / STORE_DIR
+
+    def _store_object(self, source_path, digest: str):
+        object_path = self.store / digest[:2] / digest
+        if object_path.exists():
+            return object_path
+        os.makedirs(object_path.parent, exist_ok=True)
+        temp_path = object_path.with_name(f"{digest}.{os.getpid()}.{time.monotonic_ns()}.tmp")
+        clone_file(source_path, temp_path)
+        # Atomic, so that a concurrent run storing the same content never sees a partial object
+        os.replace(temp_path, object_path)
+        return object_path
+
+    def backup(self, source_path, rel_path: str):
+        object_path = self._store_object(source_path, file_hash(source_path))
+        target_path = self.run_folder / rel_path
+        os.makedirs(target_path.parent, exist_ok=True)
+        if self.reflink:
+            if reflink_file(object_path, target_path):
+                return
+            os.unlink(target_path)
+            print(f"Reflinks are not supported in {self.run_folder.parent} - hardlinking into {self.store} instead.")
+            self.reflink = False
+        try:
+            os.link(object_path, target_path)
+        except OSError:
+            clone_file(object_path, target_path)
+
+
+class TarBackend(BackupBackend):
+    """
+    One compressed tar archive per run (<run folder>.tar.gz). Content already archived by an earlier
+    run, according to the SHA-256 index shared by all runs (INDEX_NAME), is not stored again: the
+    MANIFEST_NAME member of every archive maps each backed up path to the archive and member holding it.
+    """
+
+    def __init__(self, run_folder, compresslevel: int = 6):
+        super().__init__(run_folder)
+        self.archive_path = pathlib.Path(f"{self.run_folder}.tar.gz")
+        self.compresslevel = compresslevel
+        self.tar = None
+        self.manifest = {}
+        # Indexed only once the archive is complete, so that no run refers to a partially written one
+        self.pending = {}
+        os.makedirs(self.run_folder.parent, exist_ok=True)
+        self.index = sqlite3.connect(self.run_folder.parent / INDEX_NAME, timeout=60)
+        self.index.execute("CREATE TABLE IF NOT EXISTS objects (sha256 TEXT PRIMARY KEY, archive TEXT, member TEXT)")
+
+    @property
+    def location(self):
+        return self.archive_path
+
+    def backup(self, source_path, rel_path: str):
+        digest = file_hash(source_path)
+        stored = self.pending.get(digest)
+        if stored is None:
+            row = self.index.execute("SELECT archive, member FROM objects WHERE sha256 = ?", (digest,)).fetchone()
+            stored = tuple(row) if row else None
+        if stored is None:
+            if self.tar is None:
+                self.tar = tarfile.open(self.archive_path, "w:gz", compresslevel=self.compresslevel)
+            self.tar.add(source_path, arcname=rel_path)
+            stored = self.pending[digest] = (self.archive_path.name, rel_path)
+        self.manifest[rel_path] = {"sha256": digest, "archive": stored[0], "member": stored[1]}
+
+    def close(self):
+        try:
+            if self.manifest:
+                if self.tar is None:
+                    self.tar = tarfile.open(self.archive_path, "w:gz", compresslevel=self.compresslevel)
+                manifest = json.dumps(self.manifest, indent=2).encode()
+                info = tarfile.TarInfo(MANIFEST_NAME)
+                info.size = len(manifest)
+                info.mtime = int(time.time())
+                self.tar.addfile(info, io.BytesIO(manifest))
+            if self.tar is not None:
+                self.tar.close()
+                self.tar = None
+                with self.index:
+                    self.index.executemany("INSERT OR IGNORE INTO objects VALUES (?, ?, ?)",
+                                           ((digest, archive, member)
+                                            for digest, (archive, member) in self.pending.items()))
+        finally:
+            self.index.close()
+
+
+BACKENDS = {
+    "copy": CopyBackend,
+    "link": LinkBackend,
+    "reflink": lambda run_folder: LinkBackend(run_folder, reflink=True),
+    "tar": TarBackend,
+}
+
+
+def create_backend(name: str, run_folder) -> BackupBackend:
+    return BACKENDS[name](run_folder)
@@ -0,0 +1,108 @@
+import os
+import subprocess
+from dataclasses import dataclass, field
+from typing import List, Set, Tuple
+
+GIT_EXECUTABLE = "git.exe" if os.name == "nt" else "git"
+# Paths per git restore call; the paths are passed on stdin, so this only bounds the size of one call
+RESTORE_BATCH_SIZE = 5000
+
+
+@dataclass
+class Conflicts:
+    upstream: str = None
+    local_changes: List[str] = field(default_factory=list)
+    untracked: List[str] = field(default_factory=list)
+
+
+def run_git(root, *args, stdin: bytes = None) -> bytes:
+    # --literal-pathspecs: paths are never interpreted as globs or pathspec magic
+    return subprocess.run([GIT_EXECUTABLE, "--literal-pathspecs", "-C", str(root), *args], input=stdin,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+
+
+def _split_nul(output: bytes) -> List[str]:
+    return [os.fsdecode(path) for path in output.split(b"\0") if path]
+
+
+def parse_porcelain_v2(output: bytes) -> Tuple[List[str], List[str]]:
+    """
+    Returns the (tracked, untracked) paths of a `git status --porcelain=v2 -z` output. Renamed entries
+    report both their new and their original path.
+    """
+    tracked = []
+    untracked = []
+    records = output.split(b"\0")
+    index = 0
+    while index < len(records):
+        record = os.fsdecode(records[index])
+        index += 1
+        if not record:
+            continue
+        entry_type = record[0]
+        if entry_type == "1":
+            tracked.append(record.split(" ", 8)[8])
+        elif entry_type == "2":
+            tracked.append(record.split(" ", 9)[9])
+            # The original path of a rename/copy follows as a separate record
+            tracked.append(os.fsdecode(records[index]))
+            index += 1
+        elif entry_type == "u":
+            tracked.append(record.split(" ", 10)[10])
+        elif entry_type == "?":
+            untracked.append(record[2:])
+    return tracked, untracked
+
+
+def _parent_dirs(paths) -> Set[str]:
+    parents = set()
+    for path in paths:
+        parent = path.rpartition("/")[0]
+        while parent and parent not in parents:
+            parents.add(parent)
+            parent = parent.rpartition("/")[0]
+    return parents
+
+
+def _has_parent_in(path: str, paths: Set[str]) -> bool:
+    parent = path.rpartition("/")[0]
+    while parent:
+        if parent in paths:
+            return True
+        parent = parent.rpartition("/")[0]
+    return False
+
+
+def find_conflicts(root, fetch: bool = True) -> Conflicts:
+    """
+    Returns the local paths that would block a pull of the upstream branch, without running the merge:
+    tracked files changed both locally and upstream, and untracked files that an incoming file or
+    directory would overwrite. The incoming changes are those between the merge base and the fetched
+    upstream; paths of any depth are compared as reported by git (relative to the repository root).
+    """
+    if fetch:
+        run_git(root, "fetch", "--quiet")
+    upstream = run_git(root, "rev-parse", "--abbrev-ref", "--symbolic-full-name", "@{upstream}").decode().strip()
+    merge_base = run_git(root, "merge-base", "HEAD", "@{upstream}").decode().strip()
+    incoming = set(_split_nul(run_git(root, "diff", "--name-only", "--no-renames", "-z", merge_base, "@{upstream}")))
+    tracked, untracked = parse_porcelain_v2(run_git(root, "status", "--porcelain=v2", "-z", "--untracked-files=all"))
+
+    conflicts = Conflicts(upstream=upstream)
+    conflicts.local_changes = sorted({path for path in tracked if path in incoming})
+    incoming_dirs = _parent_dirs(incoming)
+    # An untracked file is in the way if the upstream adds it, adds a directory of the same name
+    # or adds a file where one of its parent directories is
+    conflicts.untracked = sorted(path for path in untracked
+                                 if path in incoming or path in incoming_dirs or _has_parent_in(path, incoming))
+    return conflicts
+
+
+def restore_paths(root, paths: List[str], batch_size: int = RESTORE_BATCH_SIZE):
+    """
+    Restores the index and working tree version of the paths from HEAD. The paths are passed through
+    --pathspec-from-file on stdin, so their number is not limited by the command line length.
+    """
+    for start in range(0, len(paths), batch_size):
+        batch = paths[start:start + batch_size]
+        run_git(root, "restore", "--staged", "--worktree", "--pathspec-from-file=-", "--pathspec-file-nul",
+                stdin=b"\0".join(os.fsencode(path) for path in batch))
@@ -1,99 +1,177 @@
+import argparse
 import datetime
-import os.path
 import pathlib
 import subprocess
 import re
-import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from backup_store import BACKENDS, BackupBackend, create_backend
+from conflicts import GIT_EXECUTABLE, find_conflicts, restore_paths, run_git
+
+DEFAULT_WORKERS = 4
 
 
 def split_data_into_folders(data):
     data_dict = dict()
     for el in data:
         if el:
-            split_data = el.split(r"/")
-            if len(split_data) == 2:
-                folder, file = split_data
-                file_list = data_dict.get(folder, [])
-                file_list.append(file)
-                data_dict[folder] = file_list
-            else:
-                print(f"Couldn't process {el}")
+            # Files in the repository root are grouped under ""
+            folder, _, file = el.rpartition(r"/")
+            file_list = data_dict.get(folder, [])
+            file_list.append(file)
+            data_dict[folder] = file_list
     return data_dict
 
 
 PATH_TO_COPY = pathlib.Path(r"C:\Desktop\recycle_bin")
 PATH = pathlib.Path(r"D:\Pool\Environment")
 
-proc = subprocess.Popen(["git.exe", "-C", str(PATH), "pull"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-p = "".join([el.decode() for el in proc.stdout.readlines()])
-
-local_dict = dict()
-untracked_dict = dict()
-
-current_timestamp = datetime.datetime.now().strftime("%d_%m_%y__%H_%M_%S")
-regex_local_changes = (r"(?<=error: Your local changes to the following files would be overwritten by merge:\n)(("
-                       r"?:.*\n)*)(?=Please commit)")
-regex_untracked = (r"(?<=error: The following untracked working tree files would be overwritten by merge:\n)(("
-                   r"?:.*\n)*)(?=Please move or remove them before you merge.)")
-
-local_changes = re.findall(regex_local_changes, p, flags=re.M)
-untracked = re.findall(regex_untracked, p, flags=re.M)
-
-if local_changes:
-    local_changes = local_changes[0]
-    local_changes = [el.strip() for el in local_changes.split("\n")]
 
-    print("-" * 50, "LOCAL CHANGES", "-" * 50)
-    local_dict = split_data_into_folders(local_changes)
+def read_pull_conflicts(path):
+    """Runs git pull and returns the local changes and untracked files listed in its error output."""
+    proc = subprocess.Popen([GIT_EXECUTABLE, "-C", str(path), "pull"], stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT)
+    p = "".join([el.decode() for el in proc.stdout.readlines()])
 
-if untracked:
-    untracked = untracked[0]
-    untracked = [el.strip() for el in untracked.split("\n")]
+    regex_local_changes = (r"(?<=error: Your local changes to the following files would be overwritten by merge:\n)(("
+                           r"?:.*\n)*)(?=Please commit)")
+    regex_untracked = (r"(?<=error: The following untracked working tree files would be overwritten by merge:\n)(("
+                       r"?:.*\n)*)(?=Please move or remove them before you merge.)")
 
-    print("-" * 50, "UNTRACKED FILES", "-" * 50)
-    untracked_dict = split_data_into_folders(untracked)
-
-proc = subprocess.check_output(["git.exe", "-C", str(PATH), "rev-parse", "--show-toplevel"])
-git_root_dir = proc.decode().strip()
-git_root_dir = pathlib.Path(git_root_dir)
-
-print("Path".ljust(30), PATH)
-print("Path to copy".ljust(30), PATH_TO_COPY)
-print("Git root dir:".ljust(30), git_root_dir)
-print("Local changes count:".ljust(30), len(local_changes))
-print("Untracked changes count:".ljust(30), len(untracked))
-
-if local_dict or untracked_dict:
-    COPY_FOLDER = pathlib.Path(PATH_TO_COPY, current_timestamp)
-    COPY_FOLDER.mkdir()
+    local_changes = re.findall(regex_local_changes, p, flags=re.M)
+    untracked = re.findall(regex_untracked, p, flags=re.M)
+    if local_changes:
+        local_changes = [el.strip() for el in local_changes[0].split("\n") if el.strip()]
+    if untracked:
+        untracked = [el.strip() for el in untracked[0].split("\n") if el.strip()]
+    if proc.wait() != 0 and not local_changes and not untracked:
+        raise subprocess.CalledProcessError(proc.returncode, proc.args, stderr=p.encode())
+    return local_changes, untracked
 
-    # Merging the two dicts
-    local_untracked_dict = {**local_dict, **untracked_dict}
 
-    for folder in local_untracked_dict:
+def backup_files(git_root_dir, paths, backend: BackupBackend):
+    """Backs up the files (paths relative to git_root_dir, of any depth) with the backend and deletes them."""
+    for folder, files in split_data_into_folders(paths).items():
         source_folder_path = pathlib.Path(git_root_dir, folder)
-        copy_folder_path = pathlib.Path(COPY_FOLDER, folder)
 
-        if not os.path.exists(copy_folder_path):
-            os.mkdir(copy_folder_path)
-
-        files = local_untracked_dict[folder]
         for file in files:
             source_file_path = source_folder_path / file
             if source_file_path.exists():
-                target_file_path = copy_folder_path / file
-
-                print("Copying", source_file_path, "-->", target_file_path)
-                shutil.copy(source_file_path, target_file_path)
+                rel_path = f"{folder}/{file}" if folder else file
+                print(f"Backing up {source_file_path} --> {backend.location} ({rel_path})")
+                backend.backup(source_file_path, rel_path)
                 source_file_path.unlink()
             else:
                 print(f"Source file path {source_file_path} does not exist - copying aborted.")
 
-    if local_changes:
-        # Restoring the file version for local files
-        print("Restoring the files...")
-        print(f"git -C {git_root_dir} restore {' '.join(local_changes).strip()}")
-        subprocess.call(["git.exe", "-C", str(git_root_dir), "restore", *local_changes])
 
-else:
-    print("Didn't find any conflicts. Exiting.")
\ No newline at end of file
+@dataclass
+class SyncResult:
+    path: pathlib.Path
+    duration: float = 0.0
+    local_changes: int = 0
+    untracked: int = 0
+    backup_folder: pathlib.Path = None
+    error: str = None
+
+
+def sync_repository(path, copy_folder, porcelain: bool = False, backup: str = "copy") -> SyncResult:
+    """
+    Pulls one repository: the local changes and untracked files blocking the pull are backed up into
+    copy_folder (created only if needed) with the given BACKENDS backend, deleted or restored, and the
+    pull is run again.
+    """
+    result = SyncResult(pathlib.Path(path))
+    start = time.perf_counter()
+    try:
+        if porcelain:
+            conflicts = find_conflicts(path)
+            local_changes, untracked = conflicts.local_changes, conflicts.untracked
+        else:
+            local_changes, untracked = read_pull_conflicts(path)
+        result.local_changes = len(local_changes)
+        result.untracked = len(untracked)
+
+        git_root_dir = pathlib.Path(run_git(path, "rev-parse", "--show-toplevel").decode().strip())
+        if local_changes or untracked:
+            with create_backend(backup, copy_folder) as backend:
+                result.backup_folder = backend.location
+                backup_files(git_root_dir, local_changes, backend)
+                backup_files(git_root_dir, untracked, backend)
+            if local_changes:
+                # Restoring the file version for local files
+                restore_paths(git_root_dir, local_changes)
+        if porcelain or local_changes or untracked:
+            run_git(git_root_dir, "pull", "--quiet")
+    except subprocess.CalledProcessError as e:
+        result.error = (e.stderr or b"").decode(errors="replace").strip() or str(e)
+    except Exception as e:
+        result.error = repr(e)
+    result.duration = time.perf_counter() - start
+    return result
+
+
+def _backup_folders(paths, path_to_copy, current_timestamp):
+    """Returns a backup folder of every repository, named after it and unique within the run."""
+    folders = []
+    used_names = set()
+    for path in paths:
+        name = pathlib.Path(path).resolve().name or "repository"
+        unique_name = name
+        index = 1
+        while unique_name in used_names:
+            index += 1
+            unique_name = f"{name}_{index}"
+        used_names.add(unique_name)
+        folders.append(pathlib.Path(path_to_copy, f"{unique_name}__{current_timestamp}"))
+    return folders
+
+
+def sync_repositories(paths, path_to_copy=PATH_TO_COPY, workers: int = DEFAULT_WORKERS, porcelain: bool = False,
+                      backup: str = "copy"):
+    """Runs sync_repository on every repository concurrently (git is I/O bound) and returns the results in order."""
+    current_timestamp = datetime.datetime.now().strftime("%d_%m_%y__%H_%M_%S")
+    copy_folders = _backup_folders(paths, path_to_copy, current_timestamp)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(lambda args: sync_repository(*args, porcelain=porcelain, backup=backup), zip(paths, copy_folders)))
+
+
+def print_summary(results):
+    print("-" * 50, "SUMMARY", "-" * 50)
+    print("Repository".ljust(40), "Duration".rjust(10), "Local".rjust(8), "Untracked".rjust(10), " Status")
+    for result in results:
+        status = f"FAILED: {result.error.splitlines()[0]}" if result.error else "OK"
+        print(str(result.path).ljust(40), f"{result.duration:.1f} s".rjust(10), str(result.local_changes).rjust(8),
+              str(result.untracked).rjust(10), "", status)
+        if result.backup_folder:
+            print("".ljust(40), "Backup:", result.backup_folder)
+    failed = sum(1 for result in results if result.error)
+    print(f"{len(results)} repositories, {sum(result.local_changes + result.untracked for result in results)} "
+          f"conflicting files, {failed} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="git_pull_delete_conflicts",
+        description="Backs up and discards the local files that block a git pull"
+    )
+    parser.add_argument("repositories", type=str, nargs="*", default=[PATH],
+                        help="Repositories to pull (defaults to PATH)")
+    parser.add_argument("--porcelain", action="store_true",
+                        help="Fetch and compare the upstream with git status instead of parsing the git pull errors")
+    parser.add_argument("--backup-dir", type=str, default=PATH_TO_COPY, help="Folder of the per-repository backups")
+    parser.add_argument("--backup", choices=sorted(BACKENDS), default="copy",
+                        help="copy: plain copies, link/reflink: hardlinks/reflinks into a deduplicated store, "
+                             "tar: one compressed archive per run, deduplicated across runs")
+    parser.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Number of repositories synchronized at the same time")
+    args = parser.parse_args()
+
+    print("Path to copy".ljust(30), args.backup_dir)
+    results = sync_repositories(args.repositories, args.backup_dir, workers=args.workers, porcelain=args.porcelain,
+                                backup=args.backup)
+    print_summary(results)
+    sys.exit(1 if any(result.error for result in results) else 0)
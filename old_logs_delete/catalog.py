@@ -0,0 +1,233 @@
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from scanner import DEFAULT_WORKERS, LogFile, _scan_entries, normalize_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER);
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, dir TEXT NOT NULL, size INTEGER, mtime REAL);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime);
+"""
+# Directories modified this recently may still change within their mtime granularity, so they are
+# recorded without an mtime and listed again on the next run
+MTIME_SAFETY_NS = 2 * 10 ** 9
+
+
+@dataclass(slots=True)
+class DirChange:
+    path: str
+    parent: Optional[str]
+    mtime_ns: Optional[int]
+    files: Optional[List[LogFile]] = None
+    subdirs: List[str] = field(default_factory=list)
+    removed: bool = False
+
+
+@dataclass
+class CatalogStats:
+    dirs_checked: int = 0
+    dirs_rescanned: int = 0
+    dirs_removed: int = 0
+    files_indexed: int = 0
+
+
+def _is_subpath(path: str, root: str):
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def _check_dir(dir_path: str, dir_parent: Optional[str], known_dirs: Dict[str, Optional[int]],
+               children: Dict[str, List[str]], allowed_exts, full_rescan: bool, fresh_after_ns: int):
+    """
+    Returns the DirChange of one directory. It is listed again only if its mtime differs from the
+    catalog (files added, removed or renamed in it), otherwise its subdirectories come from the catalog.
+    """
+    try:
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+    except FileNotFoundError:
+        return DirChange(dir_path, dir_parent, None, removed=True)
+    except OSError as e:
+        print(f"Couldn't scan {dir_path}: {e}")
+        return None
+
+    if not full_rescan and mtime_ns == known_dirs.get(dir_path):
+        return DirChange(dir_path, dir_parent, mtime_ns, subdirs=children.get(dir_path, []))
+    change = DirChange(dir_path, dir_parent, mtime_ns if mtime_ns < fresh_after_ns else None)
+    change.files = list(_scan_entries(dir_path, allowed_exts, change.subdirs))
+    return change
+
+
+def _walk_changed(path: str, parent: str, ignored_dirs, *check_args) -> List[DirChange]:
+    """Checks every directory of the tree under path, costing one stat per unchanged directory."""
+    changes = []
+    stack = [(path, parent)]
+    while stack:
+        dir_path, dir_parent = stack.pop()
+        if dir_path in ignored_dirs:
+            continue
+        change = _check_dir(dir_path, dir_parent, *check_args)
+        if change is not None:
+            changes.append(change)
+            stack.extend((subdir, dir_path) for subdir in change.subdirs)
+    return changes
+
+
+class ScanCatalog:
+    """
+    Persistent SQLite catalog of the log files under one or more roots: the mtime of every directory
+    and the size and mtime of its matching files. update() only lists the directories changed since
+    the previous run and expired_files() answers the age query from the mtime index, so a repeated
+    run costs one stat per directory instead of one per file. Files modified in place don't change
+    their directory's mtime, so their size/mtime is refreshed only by a full rescan.
+    """
+
+    def __init__(self, db_path):
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _extensions_changed(self, allowed_exts) -> bool:
+        extensions = ",".join(sorted(allowed_exts))
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'extensions'").fetchone()
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('extensions', ?)", (extensions,))
+        return row is not None and row[0] != extensions
+
+    def update(self, root, allowed_exts: Iterable[str], ignored_dirs: Iterable = (), workers: int = DEFAULT_WORKERS,
+               full_rescan: bool = False) -> CatalogStats:
+        """
+        Brings the catalog of the tree under root up to date, checking the top-level subtrees on a
+        thread pool; full_rescan lists every directory again. Files under ignored_dirs are not indexed.
+        """
+        allowed_exts = frozenset(allowed_exts)
+        ignored_dirs = {normalize_path(ignored_dir) for ignored_dir in ignored_dirs}
+        root = normalize_path(root)
+        # Files of newly allowed extensions are only found by listing the unchanged directories too
+        full_rescan = self._extensions_changed(allowed_exts) or full_rescan
+
+        known_dirs = {}
+        children = {}
+        for path, parent, mtime_ns in self.connection.execute("SELECT path, parent, mtime_ns FROM dirs"):
+            if _is_subpath(path, root):
+                known_dirs[path] = mtime_ns
+                if parent is not None:
+                    children.setdefault(parent, []).append(path)
+
+        check_args = (known_dirs, children, allowed_exts, full_rescan, time.time_ns() - MTIME_SAFETY_NS)
+        changes = []
+        if root not in ignored_dirs:
+            root_change = _check_dir(root, None, *check_args)
+            if root_change is not None:
+                changes.append(root_change)
+                subtrees = root_change.subdirs
+                if workers > 1 and len(subtrees) > 1:
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        futures = [executor.submit(_walk_changed, subtree, root, ignored_dirs, *check_args)
+                                   for subtree in subtrees]
+                        for future in as_completed(futures):
+                            changes.extend(future.result())
+                else:
+                    for subtree in subtrees:
+                        changes.extend(_walk_changed(subtree, root, ignored_dirs, *check_args))
+        return self._apply(changes, children)
+
+    def _delete_tree(self, path: str):
+        prefix = path.rstrip(os.sep) + os.sep
+        self.connection.execute("DELETE FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?",
+                                (path, len(prefix), prefix))
+        self.connection.execute("DELETE FROM files WHERE dir = ? OR substr(dir, 1, ?) = ?",
+                                (path, len(prefix), prefix))
+
+    def _apply(self, changes: List[DirChange], children: Dict[str, List[str]]) -> CatalogStats:
+        stats = CatalogStats()
+        # Written by the calling thread in a single transaction, the scanning threads never touch SQLite
+        with self.connection:
+            for change in changes:
+                if change.removed:
+                    self._delete_tree(change.path)
+                    stats.dirs_removed += 1
+                    continue
+                stats.dirs_checked += 1
+                if change.files is None:
+                    continue
+
+                stats.dirs_rescanned += 1
+                for subdir in set(children.get(change.path, [])) - set(change.subdirs):
+                    self._delete_tree(subdir)
+                    stats.dirs_removed += 1
+                self.connection.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)",
+                                        (change.path, change.parent, change.mtime_ns))
+                self.connection.execute("DELETE FROM files WHERE dir = ?", (change.path,))
+                self.connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                                            ((log_file.path, change.path, log_file.size, log_file.mtime)
+                                             for log_file in change.files))
+                stats.files_indexed += len(change.files)
+        return stats
+
+    def iter_files(self, root, older_than: float = None, ordered: bool = False) -> Iterator[LogFile]:
+        """
+        Yields the cataloged files under root, in no particular order unless ordered (oldest first); with
+        older_than (POSIX timestamp) only the ones modified before it, which is answered from the mtime index.
+        """
+        root = normalize_path(root)
+        prefix = root.rstrip(os.sep) + os.sep
+        query = "SELECT path, size, mtime FROM files WHERE mtime < ? AND (dir = ? OR substr(dir, 1, ?) = ?)"
+        rows = self.connection.execute(query + " ORDER BY mtime" if ordered else query,
+                                       (float("inf") if older_than is None else older_than, root, len(prefix),
+                                        prefix))
+        for path, size, mtime in rows:
+            yield LogFile(path, size, mtime)
+
+    def files(self, root, older_than: float = None) -> List[LogFile]:
+        """Returns the cataloged files under root, oldest first; with older_than only the ones modified before it."""
+        return list(self.iter_files(root, older_than, ordered=True))
+
+    def expired_files(self, root, older_than: float) -> List[LogFile]:
+        """Returns the cataloged files under root with an mtime (POSIX timestamp) before older_than, oldest first."""
+        return self.files(root, older_than)
+
+    def refresh_files(self, log_files: Iterable[LogFile]) -> Tuple[List[LogFile], int]:
+        """
+        Stats the given cataloged files again: a file written in place doesn't change the mtime of its
+        directory, so its catalog row can be stale. Rows of changed files are updated and missing files are
+        dropped. Returns the current state of the files that still exist and the number of changed or missing ones.
+        """
+        current = []
+        updated = []
+        missing = []
+        for log_file in log_files:
+            try:
+                stat = os.stat(log_file.path)
+            except FileNotFoundError:
+                missing.append(log_file.path)
+                continue
+            fresh = LogFile(log_file.path, stat.st_size, stat.st_mtime)
+            if fresh.size != log_file.size or fresh.mtime != log_file.mtime:
+                updated.append(fresh)
+            current.append(fresh)
+        with self.connection:
+            self.connection.executemany("UPDATE files SET size = ?, mtime = ? WHERE path = ?",
+                                        ((log_file.size, log_file.mtime, log_file.path) for log_file in updated))
+            self.connection.executemany("DELETE FROM files WHERE path = ?", ((path,) for path in missing))
+        return current, len(updated) + len(missing)
+
+    def remove_files(self, paths: Iterable[str]):
+        """Drops moved or deleted files from the catalog."""
+        with self.connection:
+            self.connection.executemany("DELETE FROM files WHERE path = ?", ((path,) for path in paths))
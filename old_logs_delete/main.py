@@ -4,6 +4,11 @@ import os
 import pathlib
 from typing import List
 
+from catalog import ScanCatalog
+from mover import move_files, purge_dir
+from quota import ROOT_GROUP, freed_per_directory, parse_size, select_quota_victims
+from scanner import DEFAULT_WORKERS, LogFile, scan_tree
+
 ########################################################################################################################
 DAY_COUNT = 45
 ALLOWED_EXTS = [
@@ -17,43 +22,24 @@ ALLOWED_EXTS = [
 # #######################################################################################################################
 
 ALLOWED_EXTS = ["." + ext.replace(".", "").upper() for ext in ALLOWED_EXTS]
+# Quota selections made again when cataloged candidates turned out to be stale
+QUOTA_SELECTION_PASSES = 3
 count = 0
 file_size = 0
 
 
-def move_file_if_date_modified_greater_than(file: pathlib.Path, **kwargs):
-    to_be_deleted_path = kwargs.get("to_be_deleted_path", None)
-    if to_be_deleted_path is None:
-        raise SystemExit("TO_BE_DELETED path is set to None!")
-
-    if file.suffix.upper() in ALLOWED_EXTS:
-        converted_date = datetime.date.fromtimestamp(os.path.getmtime(file))
-        date_diff = datetime.datetime.now().date() - converted_date
-        if date_diff.days > DAY_COUNT:
-            print("TO BE DELETED", file)
-            new_path = pathlib.Path.joinpath(to_be_deleted_path, file.name)
-            file.replace(target=new_path)
-            global count
-            global file_size
-            count += 1
-            file_size += os.path.getsize(new_path)
-
-
-def _clean_dir(path):
-    path = pathlib.Path(path)
-    for file in path.iterdir():
-        if not file.is_dir():
-            file.unlink()
-
-
-def _traverse_dir(path, function, ignored_dirs: List[pathlib.Path], **kwargs):
-    path = pathlib.Path(path)
-    if path not in ignored_dirs:
-        if path.is_dir():
-            for file in path.iterdir():
-                _traverse_dir(file, function, ignored_dirs, **kwargs)
-        else:
-            return function(path, **kwargs)
+def expiry_cutoff(today: datetime.date = None) -> float:
+    """Returns the timestamp before which a file is older than DAY_COUNT days, counted in whole days."""
+    today = today or datetime.datetime.now().date()
+    return datetime.datetime.combine(today - datetime.timedelta(days=DAY_COUNT), datetime.time.min).timestamp()
+
+
+def print_freed_report(log_files: List[LogFile]):
+    freed = freed_per_directory(log_files)
+    for dir_path, (file_count, dir_bytes) in freed.items():
+        print(f"{(dir_bytes / (1024 * 1024 * 1024)):.3f} GB".rjust(14), f"{file_count:>8} files", dir_path)
+    print(f"Total: {sum(dir_bytes for _, dir_bytes in freed.values()) / (1024 * 1024 * 1024):.3f} GB "
+          f"in {len(log_files)} files")
 
 
 if __name__ == "__main__":
@@ -64,6 +50,19 @@ if __name__ == "__main__":
     parser.add_argument("-path", type=str, nargs="?", default=pathlib.Path(os.getcwd()))
     parser.add_argument("-tbd", type=str, nargs="?", default=None)
     parser.add_argument("-m", "--manual", action="store_true")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Number of threads scanning the top-level subdirectories")
+    parser.add_argument("--catalog", type=str, default=None,
+                        help="SQLite scan catalog; only directories changed since the previous run are listed")
+    parser.add_argument("--full-rescan", action="store_true", help="List every directory again to refresh the catalog")
+    parser.add_argument("--quota", type=str, default=None,
+                        help="Byte budget of the whole path (e.g. 500G); the oldest logs over it are moved "
+                             "instead of the ones older than DAY_COUNT. Logs with an --ext-quota count against "
+                             "both budgets")
+    parser.add_argument("--ext-quota", type=str, action="append", default=[], metavar="EXT=SIZE",
+                        help="Byte budget of one extension (e.g. BLF=200G), can be repeated")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only report the bytes that would be freed per directory")
     args = parser.parse_args()
 
     if args.path is not None and os.path.exists(args.path):
@@ -76,7 +75,15 @@ if __name__ == "__main__":
     else:
         TO_BE_DELETED_PATH = pathlib.Path(path_to_be_traversed).joinpath("TO_BE_DELETED")
 
-    if not os.path.exists(TO_BE_DELETED_PATH):
+    try:
+        root_budget = parse_size(args.quota) if args.quota else None
+        ext_budgets = {"." + ext.strip().replace(".", "").upper(): parse_size(size)
+                       for ext, size in (ext_quota.split("=", 1) for ext_quota in args.ext_quota)}
+    except ValueError as e:
+        raise SystemExit(f"Invalid quota: {e}")
+    quota_mode = root_budget is not None or bool(ext_budgets)
+
+    if not os.path.exists(TO_BE_DELETED_PATH) and not args.dry_run:
         try:
             os.mkdir(TO_BE_DELETED_PATH)
         except:
@@ -87,15 +94,75 @@ if __name__ == "__main__":
     print("TO_BE_DELETED_PATH:", TO_BE_DELETED_PATH)
     print("*" * 50)
 
-    _traverse_dir(path_to_be_traversed, move_file_if_date_modified_greater_than,
-                  ignored_dirs=[TO_BE_DELETED_PATH],
-                  to_be_deleted_path=TO_BE_DELETED_PATH)
+    today = datetime.datetime.now().date()
+    catalog = ScanCatalog(args.catalog) if args.catalog else None
+    try:
+        if catalog:
+            stats = catalog.update(path_to_be_traversed, ALLOWED_EXTS, ignored_dirs=[TO_BE_DELETED_PATH],
+                                   workers=args.workers, full_rescan=args.full_rescan)
+            print(f"Catalog: {stats.dirs_checked} directories checked, {stats.dirs_rescanned} rescanned, "
+                  f"{stats.dirs_removed} removed")
+
+        if quota_mode:
+            for _ in range(QUOTA_SELECTION_PASSES):
+                log_files = catalog.iter_files(path_to_be_traversed) if catalog else \
+                    scan_tree(path_to_be_traversed, ALLOWED_EXTS, ignored_dirs=[TO_BE_DELETED_PATH],
+                              workers=args.workers)
+                quota_groups = select_quota_victims(log_files, root_budget, ext_budgets)
+                victims = [victim for group in quota_groups.values() for victim in group.victims]
+                if not catalog:
+                    break
+                # The catalog rows of the victims are checked against the disk, the selection is made again
+                # with the fresh sizes and mtimes if any of them changed
+                victims, changed = catalog.refresh_files(victims)
+                if not changed:
+                    break
+                print(f"{changed} cataloged files changed since the last scan")
+            for group_name, group in quota_groups.items():
+                print(f"{'Whole path' if group_name == ROOT_GROUP else group_name}: "
+                      f"{group.usage / (1024 * 1024 * 1024):.3f} GB used, budget "
+                      f"{group.budget / (1024 * 1024 * 1024):.3f} GB, {len(group.victims)} files over it")
+        else:
+            cutoff = expiry_cutoff(today)
+            if catalog:
+                # Files written since the catalog has seen them may not be old enough anymore
+                candidates, _ = catalog.refresh_files(catalog.expired_files(path_to_be_traversed, cutoff))
+            else:
+                candidates = scan_tree(path_to_be_traversed, ALLOWED_EXTS, ignored_dirs=[TO_BE_DELETED_PATH],
+                                       workers=args.workers)
+            victims = [log_file for log_file in candidates if log_file.mtime < cutoff]
+
+        if args.dry_run:
+            print_freed_report(victims)
+            raise SystemExit(0)
+
+        for log_file in victims:
+            print("TO BE DELETED", log_file.path)
+        result = move_files(victims, TO_BE_DELETED_PATH, workers=args.workers)
+        count += len(result.done)
+        file_size += result.size
+        print(f"Moved {len(result.done)} files ({result.size / (1024 * 1024 * 1024):.3f} GB) in {result.elapsed:.1f} s, "
+              f"{result.throughput / (1024 * 1024):.1f} MB/s")
+        for log_file, error in result.failed:
+            print(f"Couldn't move {log_file.path}: {error}")
+        if catalog:
+            # Files removed since the catalog has seen them are dropped from it as well
+            catalog.remove_files(log_file.path for log_file in result.done + result.missing)
+    finally:
+        if catalog:
+            catalog.close()
+
     if count:
         response = input(
             f"Do you want to clean the TO_BE_DELETED directory. This operation would clear "
             f"{(file_size / (1024 * 1024 * 1024)):.3} GB of memory.\nY - Yes / N - No: ")
         if response.upper().strip() == "Y":
-            _clean_dir(TO_BE_DELETED_PATH)
-            print("TO_BE_DELETED directory has been cleaned!")
+            result = purge_dir(TO_BE_DELETED_PATH, workers=args.workers)
+            print(f"TO_BE_DELETED directory has been cleaned! Freed {result.size / (1024 * 1024 * 1024):.3f} GB "
+                  f"in {result.elapsed:.1f} s")
+            for log_file, error in result.failed:
+                print(f"Couldn't delete {log_file.path}: {error}")
+    elif quota_mode:
+        print("All quotas are met. Exiting.")
     else:
         print(f"No file older than {DAY_COUNT} days has been found. Exiting.")
@@ -0,0 +1,185 @@
+import errno
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Iterable, List, Tuple
+
+from scanner import DEFAULT_WORKERS, LogFile, _scan_entries
+
+BATCH_SIZE = 256
+PROGRESS_INTERVAL = 2.0
+# copy_file_range can't copy between these filesystems, or isn't available at all
+_COPY_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP}
+_COPY_CHUNK = 64 * 1024 * 1024
+
+
+@dataclass
+class TransferResult:
+    done: List[LogFile] = field(default_factory=list)
+    missing: List[LogFile] = field(default_factory=list)
+    failed: List[Tuple[LogFile, OSError]] = field(default_factory=list)
+    size: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self):
+        """Bytes per second."""
+        return self.size / self.elapsed if self.elapsed else 0.0
+
+    def merge(self, other: "TransferResult"):
+        self.done.extend(other.done)
+        self.missing.extend(other.missing)
+        self.failed.extend(other.failed)
+        self.size += other.size
+
+
+def _kernel_copy(src: str, dst: str):
+    """
+    Copies src to dst inside the kernel: copy_file_range, else sendfile, else a buffered copy. dst is
+    created or truncated.
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if hasattr(os, "copy_file_range"):
+            copied = 0
+            try:
+                while True:
+                    sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), _COPY_CHUNK)
+                    if sent == 0:
+                        return
+                    copied += sent
+            except OSError as e:
+                if e.errno not in _COPY_FALLBACK_ERRNOS or copied:
+                    raise
+        if hasattr(os, "sendfile"):
+            try:
+                offset = 0
+                while True:
+                    sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, _COPY_CHUNK)
+                    if sent == 0:
+                        return
+                    offset += sent
+            except OSError as e:
+                if e.errno not in _COPY_FALLBACK_ERRNOS or offset:
+                    raise
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+
+
+class BulkMover:
+    """
+    Moves files into one target directory. A rename is tried first; once it fails with EXDEV for a
+    source directory, the files of that directory are copied inside the kernel and unlinked instead.
+    Files of the same name get a unique "<stem>__<n><suffix>" name, so none overwrites another.
+    """
+
+    def __init__(self, target_dir):
+        self.target_dir = str(target_dir)
+        self._cross_device_dirs = set()
+        self._next_index = {}
+        self._lock = threading.Lock()
+
+    def _reserve_path(self, name: str) -> str:
+        """
+        Claims a new path in the target directory by creating an empty placeholder with O_EXCL, which the
+        move then replaces. Only the next suffix index of a name is taken under the lock, the filesystem
+        is checked outside of it.
+        """
+        stem, suffix = os.path.splitext(name)
+        while True:
+            with self._lock:
+                index = self._next_index.get(name, 1)
+                self._next_index[name] = index + 1
+            candidate = os.path.join(self.target_dir, name if index == 1 else f"{stem}__{index}{suffix}")
+            try:
+                os.close(os.open(candidate, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+            except FileExistsError:
+                continue
+            return candidate
+
+    def move(self, log_file: LogFile):
+        new_path = self._reserve_path(os.path.basename(log_file.path))
+        try:
+            source_dir = os.path.dirname(log_file.path)
+            if source_dir not in self._cross_device_dirs:
+                try:
+                    os.replace(log_file.path, new_path)
+                    return
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+                    with self._lock:
+                        self._cross_device_dirs.add(source_dir)
+            _kernel_copy(log_file.path, new_path)
+            # Keeps the age of the file, so that a later run sees the same mtime
+            os.utime(new_path, (log_file.mtime, log_file.mtime))
+        except BaseException:
+            # The placeholder (or the partial copy) is ours
+            if os.path.lexists(new_path):
+                os.unlink(new_path)
+            raise
+        os.unlink(log_file.path)
+
+
+def _unlink(log_file: LogFile):
+    os.unlink(log_file.path)
+
+
+def _run_batch(function, log_files: List[LogFile]) -> TransferResult:
+    result = TransferResult()
+    for log_file in log_files:
+        try:
+            function(log_file)
+        except FileNotFoundError:
+            result.missing.append(log_file)
+        except OSError as e:
+            result.failed.append((log_file, e))
+        else:
+            result.done.append(log_file)
+            result.size += log_file.size
+    return result
+
+
+def _batches(log_files: Iterable[LogFile], batch_size: int):
+    batch = []
+    for log_file in log_files:
+        batch.append(log_file)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _run_parallel(function, log_files: List[LogFile], workers: int, action: str) -> TransferResult:
+    """
+    Runs function on every file in batches on a bounded thread pool; sizes are taken from the already
+    collected LogFile data. Progress and throughput are printed every PROGRESS_INTERVAL seconds.
+    """
+    total = TransferResult()
+    total_bytes = sum(log_file.size for log_file in log_files)
+    start = last_report = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(_run_batch, function, batch) for batch in _batches(log_files, BATCH_SIZE)]
+        for future in as_completed(futures):
+            total.merge(future.result())
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                print(f"{action}: {len(total.done)}/{len(log_files)} files, "
+                      f"{total.size / (1024 * 1024 * 1024):.3f}/{total_bytes / (1024 * 1024 * 1024):.3f} GB, "
+                      f"{total.size / (now - start) / (1024 * 1024):.1f} MB/s")
+    total.elapsed = time.perf_counter() - start
+    return total
+
+
+def move_files(log_files: List[LogFile], target_dir, workers: int = DEFAULT_WORKERS) -> TransferResult:
+    """Moves the files into target_dir, renaming on the same device and copying across devices."""
+    return _run_parallel(BulkMover(target_dir).move, log_files, workers, "Moved")
+
+
+def purge_dir(path, workers: int = DEFAULT_WORKERS) -> TransferResult:
+    """Deletes the files directly in path; the bytes freed come from the stat data of its listing."""
+    log_files = list(_scan_entries(os.fspath(path), None, []))
+    return _run_parallel(_unlink, log_files, workers, "Deleted")
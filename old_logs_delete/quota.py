@@ -0,0 +1,94 @@
+import heapq
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from scanner import LogFile
+
+ROOT_GROUP = "*"
+SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(text: str) -> int:
+    """Parses a byte count such as "1048576", "500M", "1.5GB" or "2TiB" (binary units)."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*", text.upper())
+    if not match:
+        raise ValueError(f"Invalid size: {text}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+@dataclass
+class QuotaGroup:
+    """
+    Streaming selection of the files to evict from one budget. The newest files are kept in a min-heap
+    ordered by mtime while they fit in the budget; whenever they don't, the oldest kept file becomes a
+    victim. Once a file is evicted, every file older than it is a victim as well, whatever order the files
+    arrive in, so the result is the same as evicting the oldest files of the sorted tree. Only the kept
+    files and the victims are held in memory, the tree is never sorted as a whole.
+    """
+    budget: int
+    usage: int = 0
+    kept_size: int = 0
+    kept: list = field(default_factory=list)
+    victims: List[LogFile] = field(default_factory=list)
+    # (mtime, path) of the newest victim
+    cutoff: tuple = None
+
+    def add(self, log_file: LogFile):
+        self.usage += log_file.size
+        order = (log_file.mtime, log_file.path)
+        if self.cutoff is not None and order < self.cutoff:
+            self.victims.append(log_file)
+            return
+        self.kept_size += log_file.size
+        heapq.heappush(self.kept, (*order, log_file))
+        while self.kept_size > self.budget:
+            mtime, path, oldest = heapq.heappop(self.kept)
+            self.kept_size -= oldest.size
+            self.victims.append(oldest)
+            self.cutoff = (mtime, path)
+
+    @property
+    def freed(self):
+        return self.usage - self.kept_size
+
+
+def select_quota_victims(log_files: Iterable[LogFile], root_budget: Optional[int] = None,
+                         ext_budgets: Optional[Dict[str, int]] = None) -> Dict[str, QuotaGroup]:
+    """
+    Picks the oldest files to evict until every budget is met. Files whose extension (".EXT", upper
+    case) has its own budget in ext_budgets count against it, and every file counts against root_budget:
+    the files an extension budget keeps are weighed against root_budget together with the others once all
+    files are seen. Returns the QuotaGroup of every budget, keyed by the extension or ROOT_GROUP; a file
+    is a victim of at most one group.
+    """
+    ext_budgets = ext_budgets or {}
+    groups = {ext: QuotaGroup(budget) for ext, budget in ext_budgets.items()}
+    if root_budget is not None:
+        groups[ROOT_GROUP] = QuotaGroup(root_budget)
+
+    for log_file in log_files:
+        ext = os.path.splitext(log_file.path)[1].upper()
+        group = groups.get(ext if ext in ext_budgets else ROOT_GROUP)
+        if group is not None:
+            group.add(log_file)
+
+    root_group = groups.get(ROOT_GROUP)
+    if root_group is not None:
+        for ext in ext_budgets:
+            # Evicted by their extension budget, so already off the whole path as well
+            root_group.usage += groups[ext].freed
+            for _, _, log_file in list(groups[ext].kept):
+                root_group.add(log_file)
+    return groups
+
+
+def freed_per_directory(log_files: Iterable[LogFile]) -> Dict[str, List[int]]:
+    """Returns [file count, bytes] of the given files per directory, largest first."""
+    freed = {}
+    for log_file in log_files:
+        dir_freed = freed.setdefault(os.path.dirname(log_file.path), [0, 0])
+        dir_freed[0] += 1
+        dir_freed[1] += log_file.size
+    return dict(sorted(freed.items(), key=lambda item: item[1][1], reverse=True))
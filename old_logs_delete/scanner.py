@@ -0,0 +1,82 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List
+
+DEFAULT_WORKERS = 8
+
+
+@dataclass(slots=True)
+class LogFile:
+    path: str
+    size: int
+    mtime: float
+
+
+def normalize_path(path) -> str:
+    """Returns the absolute, case-normalized form of a str or Path, so that both compare equal."""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _matches_extension(name: str, allowed_exts) -> bool:
+    return allowed_exts is None or os.path.splitext(name)[1].upper() in allowed_exts
+
+
+def _scan_entries(dir_path: str, allowed_exts, subdirs: List[str]) -> Iterator[LogFile]:
+    """
+    Yields the matching files of one directory (all of them if allowed_exts is None) and appends its
+    subdirectories to subdirs.
+    """
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(os.path.normcase(entry.path))
+                    elif _matches_extension(entry.name, allowed_exts):
+                        stat_result = entry.stat()
+                        yield LogFile(entry.path, stat_result.st_size, stat_result.st_mtime)
+                except OSError as e:
+                    print(f"Couldn't read {entry.path}: {e}")
+    except OSError as e:
+        print(f"Couldn't scan {dir_path}: {e}")
+
+
+def scan_dir(path, allowed_exts: Iterable[str], ignored_dirs: Iterable = ()) -> Iterator[LogFile]:
+    """
+    Yields the files of the tree under path whose extension is in allowed_exts (".EXT", upper case).
+    The tree is walked iteratively with os.scandir, so deep trees can't hit the recursion limit; the
+    extension is checked on the name before any stat call and the stat result cached by the DirEntry
+    is reused for the size and mtime. Symlinked directories are not followed and directories that
+    can't be listed are skipped.
+    """
+    allowed_exts = frozenset(allowed_exts)
+    ignored_dirs = {normalize_path(ignored_dir) for ignored_dir in ignored_dirs}
+    stack = [normalize_path(path)]
+    while stack:
+        dir_path = stack.pop()
+        if dir_path not in ignored_dirs:
+            yield from _scan_entries(dir_path, allowed_exts, stack)
+
+
+def scan_tree(path, allowed_exts: Iterable[str], ignored_dirs: Iterable = (),
+              workers: int = DEFAULT_WORKERS) -> Iterator[LogFile]:
+    """
+    Same as scan_dir, but every top-level subdirectory of path is scanned on a thread pool of the
+    given size. Directory listing and stat calls release the GIL, so the scans overlap their I/O,
+    which is what dominates on network mounts. Files are yielded per subtree, as each one finishes.
+    """
+    allowed_exts = frozenset(allowed_exts)
+    ignored_dirs = {normalize_path(ignored_dir) for ignored_dir in ignored_dirs}
+    root = normalize_path(path)
+    if workers <= 1 or root in ignored_dirs:
+        yield from scan_dir(root, allowed_exts, ignored_dirs)
+        return
+
+    subtrees: List[str] = []
+    yield from _scan_entries(root, allowed_exts, subtrees)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(lambda subtree: list(scan_dir(subtree, allowed_exts, ignored_dirs)), subtree)
+                   for subtree in subtrees]
+        for future in as_completed(futures):
+            yield from future.result()